@@ -1,23 +1,36 @@
 import { useState } from "react";
 import "./styles.css";
 
+const formatCorner = (corner) =>
+  corner ? "(" + corner.join(", ") + ")" : "(-1,-1,-1)";
+
 const OutputPage = ({ result, setResult }) => {
   const [showPlacedPackages, setShowPlacedPackages] = useState(true);
   const [showUnplacedPackages, setShowUnplacedPackages] = useState(true);
 
-  const getFile = () => {
+  const requestFile = (body) =>
     fetch("http://localhost:5000/get-file", {
       method: "POST",
       headers: {
         "Content-Type": "application/json; charset=UTF-8",
         "Access-Control-Allow-Origin": "http://localhost:5000",
       },
-      body: JSON.stringify({
-        output_data: result.data,
-      }),
-    })
-      .then((res) => res.json())
+      body: JSON.stringify(body),
+    }).then((res) => res.json());
+
+  const getFile = () => {
+    // the server may have forgotten the plan (cache eviction or restart), so fall back to sending the plan itself
+    (result.plan_id
+      ? requestFile({ plan_id: result.plan_id }).then((data) =>
+          data.success ? data : requestFile({ output_data: result.data })
+        )
+      : requestFile({ output_data: result.data })
+    )
       .then((data) => {
+        if (!data.success) {
+          console.log(data.error);
+          return;
+        }
         window.location.href =
           "http://localhost:5000/download-file/" + data.filename;
       })
@@ -85,16 +98,8 @@ const OutputPage = ({ result, setResult }) => {
                       <td>{pkg.name}</td>
                       <td>{pkg.is_priority ? "Priority" : "Economy"}</td>
                       <td>{pkg.uld ? pkg.uld : "None"}</td>
-                      <td>
-                        {pkg.reference_corner
-                          ? pkg.reference_corner
-                          : "(-1,-1,-1)"}
-                      </td>
-                      <td>
-                        {pkg.diagonally_opposite_corner
-                          ? pkg.diagonally_opposite_corner
-                          : "(-1,-1,-1)"}
-                      </td>
+                      <td>{formatCorner(pkg.reference_corner)}</td>
+                      <td>{formatCorner(pkg.diagonally_opposite_corner)}</td>
                     </tr>
                   );
                 }
@@ -1,37 +1,44 @@
+import time
+import random
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple
+import numpy as np
 from .package import Package
+from .package_table import PackageTable
+from .density_index import DensityIndex, as_density_index
+from .uld_selector import UldSelector, uld_capacity, package_totals
 from .uld import ULD
-from .utils import log, save_file_and_get_name
+from .config import PackingConfig, DEFAULT_ORIENTATION_ORDER
+from .utils import log
+from .metrics import metrics, profiled
+from .progress import Progress
+from .bounds import CostBounds
+from .extreme_points import extreme_point_pack
+from .stability import Stability
+from .shared_manifest import SharedManifest
 
 
 def select_uld(
-    list_of_ulds: List[ULD], priority_package_list: List[Package]
-):  # returns best available uld, taking in the list of remaining priority packages
+    list_of_ulds: List[ULD], priority_package_list
+):  # returns best available uld, taking in the list (or DensityIndex) of remaining priority packages. The stacking stages use a UldSelector instead, which scores the ulds over arrays
 
     uld_list = list_of_ulds.copy()
 
     if uld_list == []:
         return None
 
-    if priority_package_list == []:
+    total_priority_package_weight, total_priority_package_volume = package_totals(
+        priority_package_list
+    )
+    if len(priority_package_list) == 0 or total_priority_package_volume <= 0:
         return uld_list[0]
 
-    total_priority_package_weight = 0
-    total_priority_package_volume = 0
-
-    for package in priority_package_list:
-        total_priority_package_weight += package.weight
-        total_priority_package_volume += package.volume
-
     density = total_priority_package_weight / total_priority_package_volume
-    capacity = (
-        lambda uld: (uld.volume) * (uld.weight_limit) / (density - uld.pseudo_density)
-    )  # heuristic value of a uld. Takes density into account as well as how spacious it is.
 
     best_cap = 0
     best_uld = uld_list[0]
     for uld in uld_list:
-        cap = capacity(uld)
+        cap = uld_capacity(uld, density)
         if cap > best_cap:
             best_cap = cap
             best_uld = uld
@@ -42,55 +49,15 @@ def select_uld(
 ### Density Grouping
 
 
-def binary_search_closest(
-    lst: List[float], n: float
-):  # takes in a sorted list (ascending order) and tries to find the value closest to n in it. returns its index
-
-    if len(lst) == 0:
-        return None
-
-    first_pointer = 0
-    last_pointer = len(lst) - 1
-    best_idx = 0
-    best_score = abs(lst[best_idx] - n)
-
-    while last_pointer - first_pointer > 1:
-
-        middle_pointer = (last_pointer + first_pointer) // 2
-        element = lst[middle_pointer]
-        score = abs(element - n)
-
-        if score < best_score:
-            best_score = score
-            best_idx = middle_pointer
-
-        if element < n:
-            first_pointer = middle_pointer + 1
-        else:
-            last_pointer = middle_pointer - 1
-
-    elem1, elem2 = (
-        lst[first_pointer],
-        lst[last_pointer],
-    )  # checking the last two (or one) elements
-    if abs(elem1 - n) < best_score:
-        best_score = abs(elem1 - n)
-        best_idx = first_pointer
-    if abs(elem2 - n) < best_score:
-        best_score = abs(elem2 - n)
-        best_idx = last_pointer
-
-    return best_idx
-
-
 def allocate_packages(
-    uld: ULD, list_of_packages: List[Package]
-):  # takes in a single uld and a big list of packages and selects some of them for the uld so as to minimize wastage of space and weight. Also returns loss (maximum of the two losses)
+    uld: ULD, list_of_packages, selection="density"
+):  # takes in a single uld and a big list (or DensityIndex) of packages and selects some of them for the uld so as to minimize wastage of space and weight.
+    # selected packages are removed from a given DensityIndex, the caller adds back whatever does not get placed
+    # selection "value" hands over to allocate_packages_by_value
 
-    package_list = list_of_packages.copy()
-    density = lambda package: package.density
-    package_list.sort(key=density)
-    density_list = [package.density for package in package_list]
+    density_index = as_density_index(list_of_packages)
+    if selection == "value":
+        return allocate_packages_by_value(uld, density_index)
 
     desired_density = uld.pseudo_density  # this value will change over time
     remaining_volume = uld.volume
@@ -98,11 +65,10 @@ def allocate_packages(
 
     selected_packages = []
     while True:
-        idx = binary_search_closest(density_list, desired_density)
-        if idx == None:
+        best_package = density_index.nearest(desired_density)
+        if best_package == None:
             break
 
-        best_package = package_list[idx]
         if (
             best_package.weight > remaining_weight_limit
             or best_package.volume > remaining_volume
@@ -110,8 +76,7 @@ def allocate_packages(
             break
 
         selected_packages.append(best_package)
-        package_list.pop(idx)
-        density_list.pop(idx)
+        density_index.remove(best_package)
         remaining_volume -= best_package.volume
         remaining_weight_limit -= best_package.weight
         if remaining_volume == 0 or remaining_weight_limit == 0:
@@ -121,6 +86,62 @@ def allocate_packages(
     return selected_packages
 
 
+def allocate_packages_by_value(
+    uld: ULD, density_index: DensityIndex
+):  # same contract as allocate_packages, but picks packages greedily by delay cost per share of the uld they take (volume share + weight share), so expensive packages are not crowded out by cheap ones
+    # each round takes the longest run of best ranked packages that fits as a whole, then drops everything that no longer fits on its own, all over arrays of the alive packages
+
+    remaining_volume = uld.volume
+    remaining_weight_limit = uld.weight_limit
+    if remaining_volume <= 0 or remaining_weight_limit <= 0:
+        return []
+
+    positions = density_index.alive_positions()
+    volumes = density_index.volumes[positions]
+    weights = density_index.weights[positions]
+    share = volumes / remaining_volume + weights / remaining_weight_limit
+    order = np.argsort(
+        -(density_index.delay_costs[positions] / share), kind="stable"
+    )  # most delay cost per share first
+    positions, volumes, weights = positions[order], volumes[order], weights[order]
+
+    selected_positions = []
+    while len(positions) > 0:
+        fits = (volumes <= remaining_volume) & (weights <= remaining_weight_limit)
+        positions, volumes, weights = positions[fits], volumes[fits], weights[fits]
+        if len(positions) == 0:
+            break
+
+        within = (np.cumsum(volumes) <= remaining_volume) & (
+            np.cumsum(weights) <= remaining_weight_limit
+        )
+        taken = int(np.argmin(within)) if not (within.all()) else len(within)
+        selected_positions.extend(positions[:taken].tolist())
+        remaining_volume -= volumes[:taken].sum()
+        remaining_weight_limit -= weights[:taken].sum()
+        positions, volumes, weights = (
+            positions[taken:],
+            volumes[taken:],
+            weights[taken:],
+        )
+
+    selected_packages = [
+        density_index.sorted_packages[position] for position in selected_positions
+    ]
+    for package in selected_packages:
+        density_index.remove(package)
+
+    return selected_packages
+
+
+def return_unplaced(
+    density_index: DensityIndex, packages: List[Package]
+):  # puts the packages that did not get placed back into the index
+    for package in packages:
+        if not (package.placed):
+            density_index.add(package)
+
+
 ### Three-Dimensional Recursive Stacking
 
 
@@ -136,139 +157,228 @@ def compare_surfaces(
     return inner_area / outer_area
 
 
-def three_dimensional_recursive_stacking(
-    uld: ULD, package_list: List[Package], active_box: Tuple[Tuple[float]]
-):  # 3DRS is a legendary algorithm that fills a given ULD with a given list of packages and returns the leftovers
-    # note: active box is a pair of sets of coordinates. Format: ((x1,y1,z1),(x2,y2,z2)) representing what region is in consideration. At the start it is the ULD itself
-    # the function prioritizes priority packages over economy
+def three_dimensional_iterative_stacking(
+    uld: ULD,
+    package_list: List[Package],
+    active_box: Tuple[Tuple[float]],
+    orientation_preference_order: Tuple[str] = DEFAULT_ORIENTATION_ORDER,
+):  # 3DRS fills a given ULD with a given list of packages and returns the leftovers. Priority packages go in before economy ones
+    # active box is a pair of corners ((x1,y1,z1),(x2,y2,z2)) of the region in consideration, at the start the ULD itself. Every placed package splits what is left of its box into sub-boxes above it, beside it and behind it, which are kept on an explicit stack, so deep ulds cannot hit the recursion limit
+    # all sub-boxes share one queue. dicts keep the order of the package list and remove in O(1)
 
-    packages_in_queue = package_list.copy()
-    priority_list = [package for package in packages_in_queue if package.is_priority]
+    packages_in_queue = dict.fromkeys(package_list)
+    priority_queue = dict.fromkeys(
+        package for package in package_list if package.is_priority
+    )
 
-    x1, y1, z1 = active_box[0]
-    x2, y2, z2 = active_box[1]
-    outer_surface = (x2 - x1, y2 - y1)
-    orientation_preference_order = ["xyz", "yzx", "xzy", "zxy", "yzx", "zyx"]
+    boxes = [active_box]  # sub-boxes still to be filled, the last one is filled first
+    deepest = 1
+    while boxes != []:
+        deepest = max(deepest, len(boxes))
+        (x1, y1, z1), (x2, y2, z2) = boxes.pop()
+        outer_surface = (x2 - x1, y2 - y1)
 
-    best_fit = None
-    best_fit_fraction = 0
+        best_fit = None
+        best_fit_fraction = 0
 
-    if len(priority_list) == 0:
-        lst = packages_in_queue.copy()
-    else:
-        lst = priority_list.copy()
-
-    for package in lst:
-        for order in orientation_preference_order:
-            a, b, c = (
-                package.dimensions[order[0]],
-                package.dimensions[order[1]],
-                package.dimensions[order[2]],
-            )
-            inner_surface = (a, b)
-            area_fraction = compare_surfaces(inner_surface, outer_surface)
+        lst = priority_queue if len(priority_queue) > 0 else packages_in_queue
 
-            if (
-                area_fraction == None
-                or c > (z2 - z1)
-                or package.weight > uld.remaining_weight_limit
+        for package in lst:
+            for a, b, c in package.orientations(
+                orientation_preference_order, uld.vertical_axis
             ):
-                continue
-            if area_fraction > best_fit_fraction:
-                best_fit = package
-                best_fit_orientation = order
-                best_fit_fraction = area_fraction
-                break
+                inner_surface = (a, b)
+                area_fraction = compare_surfaces(inner_surface, outer_surface)
+
+                if (
+                    area_fraction == None
+                    or c > (z2 - z1)
+                    or package.weight > uld.remaining_weight_limit
+                ):
+                    continue
+                if area_fraction > best_fit_fraction:
+                    best_fit = package
+                    best_fit_orientation = (a, b, c)
+                    best_fit_fraction = area_fraction
+                    break
 
-    if best_fit == None:
-        return packages_in_queue
+        if best_fit == None:
+            continue
 
-    p_x = best_fit.dimensions[best_fit_orientation[0]]
-    p_y = best_fit.dimensions[best_fit_orientation[1]]
-    p_z = best_fit.dimensions[best_fit_orientation[2]]
+        p_x, p_y, p_z = best_fit_orientation
 
-    drop_successful = uld.drop_package(best_fit, x1, y1, p_x, p_y, p_z)
-    if not (drop_successful):
-        return packages_in_queue
+        drop_successful = uld.drop_package(best_fit, x1, y1, p_x, p_y, p_z)
+        if not (drop_successful):
+            continue
 
-    packages_in_queue.remove(best_fit)
+        del packages_in_queue[best_fit]
+        priority_queue.pop(best_fit, None)
 
-    packages_in_queue = three_dimensional_recursive_stacking(
-        uld, packages_in_queue, ((x1, y1, z1 + p_z), (x1 + p_x, y1 + p_y, z2))
-    )  # recursion along z
-    packages_in_queue = three_dimensional_recursive_stacking(
-        uld, packages_in_queue, ((x1, y1 + p_y, z1), (x1 + p_x, y2, z2))
-    )  # recursion along y
-    packages_in_queue = three_dimensional_recursive_stacking(
-        uld, packages_in_queue, ((x1 + p_x, y1, z1), (x2, y2, z2))
-    )  # recursion along x
+        # pushed in reverse, so the z sub-box is filled first, then y, then x
+        boxes.append(((x1 + p_x, y1, z1), (x2, y2, z2)))  # along x
+        boxes.append(((x1, y1 + p_y, z1), (x1 + p_x, y2, z2)))  # along y
+        boxes.append(((x1, y1, z1 + p_z), (x1 + p_x, y1 + p_y, z2)))  # along z
 
-    return packages_in_queue
+    metrics.record_max(
+        "stacking_max_depth", deepest
+    )  # the deepest the sub-box stack got, i.e. the recursion depth a recursive version would need
+    return list(packages_in_queue)
 
 
 ### Brute Packing
 
 
 def brute_pack(
-    uld: ULD, package_list: List[Package], precision: int
+    uld: ULD, package_list: List[Package], precision: int, deadline: float = None
 ):  # attempts to fit all given packages by brute force. precision is a natural number representing how finely we want to divide the box into areas for brute packing
-    # also returns leftovers
+    # also returns leftovers. Packages are tried from smallest to largest, each one against every grid point and orientation at once. Stops early once time.perf_counter() passes deadline
+    # every leftover that fits is placed. The first version stopped after one package per call, so plans differ from it: the 1000 package benchmark went from 601 to 649 packages placed, 17 to 18 priority ulds and cost 125148 to 125243 (see benchmark/original.json)
+
+    leftovers = [package for package in package_list if not (package.placed)]
+    if leftovers == []:
+        return leftovers
 
     x_steps = [((uld.dimensions["x"]) * i) // precision for i in range(precision + 1)]
     y_steps = [((uld.dimensions["y"]) * i) // precision for i in range(precision + 1)]
 
-    leftovers = package_list.copy()
+    grid_x, grid_y = np.meshgrid(x_steps[::-1], y_steps[::-1], indexing="ij")
+    grid_x, grid_y = grid_x.ravel(), grid_y.ravel()  # far corner first, as before
+
+    # every orientation of every package covers at least a side x side square at (x, y), so grid points without that much free room can never take a package
+    side = min(package.sides[2] for package in leftovers)
+    free = (
+        (grid_x + side <= uld.dimensions["x"])
+        & (grid_y + side <= uld.dimensions["y"])
+        & (
+            uld.height_map.max_heights(grid_x, grid_y, side, side) + side
+            <= uld.dimensions["z"]
+        )
+    )
+    grid_x, grid_y = grid_x[free], grid_y[free]
+    if len(grid_x) == 0:
+        return leftovers
+
     volume = lambda package: package.volume
 
-    flag = False
-    for x in x_steps[::-1]:
-        for y in y_steps[::-1]:
-            for package in sorted(package_list, key=volume):
-                drop_successful = uld.raw_drop(x, y, package)
-                if drop_successful:
-                    flag = True
-                    leftovers.remove(package)
-                    break
-            if flag:
-                break
+    for package in sorted(leftovers.copy(), key=volume):
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        metrics.count("brute_pack_grid_points", len(grid_x))
+        drop_successful = uld.batched_raw_drop(grid_x, grid_y, package)
+        if drop_successful:
+            leftovers.remove(package)
 
     return leftovers
 
 
+def adaptive_brute_pack(
+    uld: ULD, package_list: List[Package], max_precision: int, time_budget: float
+):  # brute packs on a coarse grid first and keeps doubling the precision (up to max_precision) while there are leftovers and time left. Returns leftovers
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+
+    leftovers = package_list.copy()
+    precision = min(2, max_precision)
+    while leftovers != []:
+        leftovers = brute_pack(uld, leftovers, precision, deadline)
+        if precision >= max_precision or (
+            deadline is not None and time.perf_counter() > deadline
+        ):
+            break
+        precision = min(precision * 2, max_precision)
+
+    return leftovers
+
+
+def fill_leftovers(
+    uld: ULD, package_list: List[Package], config: PackingConfig
+):  # brute packs leftovers into a uld with the precision settings in config (or places them at its extreme points, if config selects that engine). Returns leftovers
+    if config.placement == "extreme_points":
+        return extreme_point_pack(uld, package_list)
+    if config.adaptive:
+        return adaptive_brute_pack(
+            uld, package_list, config.precision, config.time_budget
+        )
+    return brute_pack(uld, package_list, config.precision)
+
+
+def place_packages(
+    uld: ULD, package_list: List[Package], config: PackingConfig
+):  # fills an empty uld (or an empty sub-box, see transition_stacking) with the placement engine config selects: 3DRS over the whole uld with brute packed leftovers, or the extreme point engine. Returns leftovers
+    if config.placement == "extreme_points":
+        return extreme_point_pack(uld, package_list)
+
+    leftovers = three_dimensional_iterative_stacking(
+        uld,
+        package_list,
+        ((0, 0, 0), (uld.dimensions["x"], uld.dimensions["y"], uld.dimensions["z"])),
+        config.orientation_order,
+    )
+    return fill_leftovers(uld, leftovers, config)
+
+
+def apply_stability(
+    ulds: List[ULD], config: PackingConfig
+):  # gives every empty uld the load stability rules config asks for, if any
+    if not (config.stability):
+        return
+    for uld in ulds:
+        if uld.placed_packages == []:
+            uld.set_stability(
+                Stability(
+                    uld.real_dimensions["x"],
+                    uld.real_dimensions["y"],
+                    uld.weight_limit,
+                    config.min_support,
+                    config.max_load,
+                    config.cog_envelope,
+                )
+            )
+
+
+def balance_ulds(
+    ulds: List[ULD],
+):  # holds every finished uld to the centre of gravity envelope of its load rules (if it has one), see ULD.balance. The packages taken out stay unplaced
+    for uld in ulds:
+        removed = uld.balance()
+        if removed != []:
+            metrics.count("unbalanced_packages_removed", len(removed))
+
+
 ### Packing
 
 
 def stack_priority_packages(
-    ulds: List[ULD], priority_packages: List[Package]
+    ulds: List[ULD],
+    priority_packages: List[Package],
+    config: PackingConfig = None,
+    progress: Progress = None,
 ):  # packs all priority packages into uld. returns last uld and all empty ulds.
 
-    remaining_packages = priority_packages.copy()
+    if config is None:
+        config = PackingConfig()
+
+    remaining_packages = DensityIndex(priority_packages)
     remaining_ulds = ulds.copy()
+    uld_selector = UldSelector(remaining_ulds, config.uld_selection)
+    uld = None  # stays None if there are no priority packages
 
-    while remaining_packages != []:
+    while len(remaining_packages) > 0:
 
         if remaining_ulds == []:
             raise Exception(
                 "RAN OUT OF ULDS BEFORE ALL PRIORITY PACKAGES COULD BE PACKED"
             )
 
-        uld = select_uld(remaining_ulds, remaining_packages)
+        uld = uld_selector.select(remaining_packages)
 
         selected_packages = allocate_packages(uld, remaining_packages)
-        leftovers = three_dimensional_recursive_stacking(
-            uld,
-            selected_packages,
-            (
-                (0, 0, 0),
-                (uld.dimensions["x"], uld.dimensions["y"], uld.dimensions["z"]),
-            ),
-        )
-        brute_leftovers = brute_pack(uld, leftovers, 10)
+        place_packages(uld, selected_packages, config)
 
         remaining_ulds.remove(uld)
-        remaining_packages = [
-            package for package in remaining_packages if not (package.placed)
-        ]
+        uld_selector.remove(uld)
+        return_unplaced(remaining_packages, selected_packages)
+        if progress is not None:
+            progress.uld_filled(ulds)
 
     return (
         uld,
@@ -277,17 +387,20 @@ def stack_priority_packages(
 
 
 def transition_stacking(
-    uld: ULD, economy_packages: List[Package]
+    uld: ULD, economy_packages, config: PackingConfig = None
 ):  # takes in a uld that has been filled with priority packages (but not completely) and fills the remaining space with economy packages. returns remaining economy packages
+    # economy_packages may be a list or a DensityIndex. A DensityIndex is updated in place and returned, so it can be handed on to stack_economy_packages
+
+    if config is None:
+        config = PackingConfig()
 
-    selected_priority_packages = []
-    for package_details in uld.packages:
-        package = package_details[0]
-        selected_priority_packages.append(package)
+    if uld is None:  # no priority packages, so there is no partially filled uld
+        return economy_packages
+
+    selected_priority_packages = uld.placed_packages.copy()
 
     wt = uld.remaining_weight_limit
     vol = uld.remaining_volume
-    uld.empty()
 
     dimensions = (
         uld.real_dimensions["x"],
@@ -299,16 +412,24 @@ def transition_stacking(
     imaginary_uld.weight_limit = imaginary_uld.remaining_weight_limit = wt
     imaginary_uld.pseudo_density = wt / vol
 
-    selected_economy = allocate_packages(imaginary_uld, economy_packages)
-    new_package_list = selected_priority_packages + selected_economy
-    leftovers = three_dimensional_recursive_stacking(
-        uld,
-        new_package_list,
-        ((0, 0, 0), (uld.dimensions["x"], uld.dimensions["y"], uld.dimensions["z"])),
+    economy_index = as_density_index(economy_packages)
+    selected_economy = allocate_packages(
+        imaginary_uld, economy_index, config.economy_selection
     )
-    brute_leftovers = brute_pack(
-        uld, leftovers, 10
-    )  # this list will solely be comprised of economy packages. however, this list is irrelevant and we will simply treat them as the rest of the economy packages.
+    if config.placement == "extreme_points":
+        extreme_point_pack(
+            uld, selected_economy
+        )  # priority packages stay where they are, the extreme points around them take the economy packages
+    else:
+        uld.empty()
+        new_package_list = selected_priority_packages + selected_economy
+        place_packages(
+            uld, new_package_list, config
+        )  # the leftovers will solely be comprised of economy packages. however, they are irrelevant and we will simply treat them as the rest of the economy packages.
+
+    return_unplaced(economy_index, selected_economy)
+    if economy_index is economy_packages:
+        return economy_index
 
     remaining_packages = [
         package for package in economy_packages if not (package.placed)
@@ -318,40 +439,146 @@ def transition_stacking(
 
 
 def stack_economy_packages(
-    all_ulds: List[ULD], remaining_ulds: List[ULD], remaining_packages: List[Package]
+    all_ulds: List[ULD],
+    remaining_ulds: List[ULD],
+    remaining_packages,
+    config: PackingConfig = None,
+    progress: Progress = None,
+    bounds: CostBounds = None,
 ):  # packs all the economy packages that it can across all ulds. returns economy packages that could not be stacked.
+    # remaining_packages may be a list or a DensityIndex (e.g. the one returned by transition_stacking)
+    # with bounds and config.gap_tolerance given, the final sweep is skipped once the plan is within that gap of the lower bound
 
-    while remaining_packages != [] and remaining_ulds != []:
+    if config is None:
+        config = PackingConfig()
 
-        uld = select_uld(remaining_ulds, remaining_packages)
-        selected_packages = allocate_packages(uld, remaining_packages)
+    remaining_packages = as_density_index(remaining_packages)
+    if config.economy_workers > 1:
+        fill_ulds_in_parallel(
+            all_ulds, remaining_ulds, remaining_packages, config, progress
+        )  # leaves nothing for the loop below, only the final sweep
+    uld_selector = UldSelector(remaining_ulds, config.uld_selection)
 
-        leftovers = three_dimensional_recursive_stacking(
-            uld,
-            selected_packages,
-            (
-                (0, 0, 0),
-                (uld.dimensions["x"], uld.dimensions["y"], uld.dimensions["z"]),
-            ),
+    while len(remaining_packages) > 0 and remaining_ulds != []:
+
+        uld = uld_selector.select(remaining_packages)
+        selected_packages = allocate_packages(
+            uld, remaining_packages, config.economy_selection
         )
-        packages_left_behind = brute_pack(uld, leftovers, 10)
+
+        place_packages(uld, selected_packages, config)
 
         remaining_ulds.remove(uld)
-        remaining_packages = [
-            package
-            for package in remaining_packages
-            if (package not in selected_packages) or (package in packages_left_behind)
-        ]
-
-    final_leftovers = remaining_packages
-    lost_packages = []
+        uld_selector.remove(uld)
+        return_unplaced(remaining_packages, selected_packages)
+        if progress is not None:
+            progress.uld_filled(all_ulds)
+
+    lost_packages = remaining_packages.packages()
+    if (
+        bounds is not None
+        and config.gap_tolerance is not None
+        and bounds.gap(bounds.cost(all_ulds, lost_packages)) <= config.gap_tolerance
+    ):
+        metrics.count("final_sweeps_skipped")
+        return lost_packages
+
     for uld in all_ulds:
-        packages_to_be_discarded = brute_pack(uld, final_leftovers, 10)
-        lost_packages += packages_to_be_discarded
+        lost_packages = fill_leftovers(
+            uld, lost_packages, config
+        )  # whatever does not fit here is tried in the next uld
 
     return lost_packages
 
 
+worker_manifest = None  # (name, SharedManifest, packages, ulds) of the shared manifest this worker process last attached to
+
+
+def attach_worker_manifest(
+    manifest_name,
+):  # attaches to a shared manifest and decodes it once per worker process, the pool initializer of fill_ulds_in_parallel. Returns its packages and ulds
+    global worker_manifest
+    if worker_manifest is None or worker_manifest[0] != manifest_name:
+        shared = SharedManifest.attach(manifest_name)
+        package_list, uld_list, _ = shared.manifest()
+        worker_manifest = (manifest_name, shared, package_list, uld_list)
+    return worker_manifest[2], worker_manifest[3]
+
+
+def fill_shared_uld(
+    manifest_name, uld_index, package_indices, real_frame, config: PackingConfig
+):  # runs in a worker process: fills the empty uld uld_index of a shared manifest with the given packages through place_packages. real_frame says the uld packs in its real frame. Returns its drops in order, as rows of (package index, x, y, p_x, p_y, p_z)
+    # every uld is filled once per run, so the decoded manifest is reused across tasks. Emptying the uld afterwards leaves its packages unplaced for the next task of this worker
+    # also returns the metrics snapshot of the fill, for the parent to merge
+    metrics.reset()
+    package_list, uld_list = attach_worker_manifest(manifest_name)
+    uld = uld_list[uld_index]
+    if real_frame:
+        uld.use_real_frame()
+    apply_stability([uld], config)
+    place_packages(uld, [package_list[idx] for idx in package_indices], config)
+
+    drops = np.zeros((len(uld.placed_packages), 6))
+    for row, (package, box) in enumerate(
+        zip(uld.placed_packages, uld.height_map.boxes)
+    ):  # height map boxes are in drop order and hold the exact corner the package was dropped at
+        drops[row] = (package.index, box[0], box[1], *package.placed_dimensions)
+    uld.empty()
+    return drops, metrics.snapshot()
+
+
+def fill_ulds_in_parallel(
+    all_ulds: List[ULD],
+    remaining_ulds: List[ULD],
+    remaining_packages: DensityIndex,
+    config: PackingConfig,
+    progress: Progress = None,
+):  # the parallel economy mode of stack_economy_packages. Works in waves of config.economy_workers ulds: each uld of a wave is handed its share of the economy packages up front and the wave is filled on worker processes at once
+    # the drops of every worker are replayed here in order, so each uld ends up exactly as its worker left it. Unplaced packages go back into remaining_packages before the next wave is allocated
+    packages = remaining_packages.packages()
+    package_positions = {package: idx for idx, package in enumerate(packages)}
+    uld_positions = {uld: idx for idx, uld in enumerate(remaining_ulds)}
+    uld_selector = UldSelector(remaining_ulds, config.uld_selection)
+
+    with SharedManifest.create(packages, remaining_ulds, 0) as shared, ProcessPoolExecutor(
+        max_workers=config.economy_workers,
+        initializer=attach_worker_manifest,
+        initargs=(shared.name,),
+    ) as executor:
+        while len(remaining_packages) > 0 and remaining_ulds != []:
+
+            wave = []
+            while (
+                len(wave) < config.economy_workers
+                and len(remaining_packages) > 0
+                and remaining_ulds != []
+            ):
+                uld = uld_selector.select(remaining_packages)
+                selected_packages = allocate_packages(
+                    uld, remaining_packages, config.economy_selection
+                )
+                remaining_ulds.remove(uld)
+                uld_selector.remove(uld)
+                future = executor.submit(
+                    fill_shared_uld,
+                    shared.name,
+                    uld_positions[uld],
+                    [package_positions[package] for package in selected_packages],
+                    uld.dimensions == uld.real_dimensions,
+                    config,
+                )
+                wave.append((uld, selected_packages, future))
+
+            for uld, selected_packages, future in wave:
+                drops, snapshot = future.result()
+                metrics.merge(snapshot)
+                for idx, x, y, p_x, p_y, p_z in drops.tolist():
+                    uld.drop_package(packages[int(idx)], x, y, p_x, p_y, p_z)
+                return_unplaced(remaining_packages, selected_packages)
+                if progress is not None:
+                    progress.uld_filled(all_ulds)
+
+
 ### Compiling Results
 
 
@@ -375,7 +602,7 @@ def finish_packing(
         delay_cost_sum += package.delay_cost
 
     total_cost = priority_uld_total_cost + delay_cost_sum
-    log(priority_uld_total_cost, delay_cost_sum)
+    log(priority_uld_total_cost, delay_cost_sum, "DEBUG")
     return total_cost
 
 
@@ -385,20 +612,17 @@ def confirm_validity(
 
     for package in priority_packages:
         if not (package.placed):
-            print("ERROR_LOG: NOT ALL PRIORITY PACKAGES WERE PACKED")
-            print()
-
+            log("ERROR_LOG", "NOT ALL PRIORITY PACKAGES WERE PACKED", "ERROR")
             raise Exception("NOT ALL PRIORITY PACKAGES WERE PACKED")
 
     for uld in ulds:
-        package_list = [package_details[0] for package_details in uld.packages]
+        package_list = uld.placed_packages
         total_package_volume = total_package_weight = 0
         for package in package_list:
             total_package_volume += package.volume
             total_package_weight += package.weight
         if total_package_weight > uld.weight_limit or total_package_volume > uld.volume:
-            print("ERROR_LOG: LIMITS EXCEEDED IN ONE OR MORE ULDS")
-            print()
+            log("ERROR_LOG", "LIMITS EXCEEDED IN ONE OR MORE ULDS", "ERROR")
             raise Exception("LIMITS EXCEEDED IN ONE OR MORE ULDS")
 
 
@@ -409,14 +633,17 @@ def get_data(packages: List[Package], ulds: List[ULD], k: float):
     return ulds, priority_packages, economy_packages, k
 
 
-def compile_data(ulds, packages):
+def compile_data(
+    ulds, packages
+):  # every placed package knows its uld and placement, so this is a single pass over packages
 
     package_list = []
 
     for package in packages:
         name = package.name
+        used_uld = package.uld
 
-        if not (package.placed):
+        if not (package.placed) or used_uld is None:
 
             package_dict = {
                 "name": name,
@@ -429,24 +656,19 @@ def compile_data(ulds, packages):
 
         else:
 
-            required_package_details = None
-            for uld in ulds:
-                for package_details in uld.packages:
-                    uld_package_name = package_details[0].name
-                    if uld_package_name == name:
-                        required_package_details = package_details
-                        used_uld = uld.name
-
-            _, centre_of_mass, dimensions = required_package_details
-
-            closest_corner = f"({centre_of_mass[0] - dimensions[0] / 2}, {centre_of_mass[1] - dimensions[1] / 2}, {centre_of_mass[2] - dimensions[2] / 2})"
+            centre_of_mass, dimensions = package.position, package.placed_dimensions
 
-            furthest_corner = f"({centre_of_mass[0] + dimensions[0] / 2}, {centre_of_mass[1] + dimensions[1] / 2}, {centre_of_mass[2] + dimensions[2] / 2})"
+            closest_corner = [
+                centre_of_mass[axis] - dimensions[axis] / 2 for axis in range(3)
+            ]
+            furthest_corner = [
+                centre_of_mass[axis] + dimensions[axis] / 2 for axis in range(3)
+            ]
             package_dict = {
                 "name": name,
                 "is_priority": package.is_priority,
                 "is_placed": True,
-                "uld": used_uld,
+                "uld": used_uld.name,
                 "reference_corner": closest_corner,
                 "diagonally_opposite_corner": furthest_corner,
             }
@@ -456,15 +678,98 @@ def compile_data(ulds, packages):
     return package_list
 
 
-def return_data(ulds, packages, k):
+def return_data(ulds, packages, k, bounds: CostBounds = None):
 
     economy_packages = [package for package in packages if not (package.is_priority)]
     cost = finish_packing(ulds, k, economy_packages)
+    if bounds is None:
+        bounds = CostBounds(packages, ulds, k)
 
     package_list = compile_data(ulds, packages)
     packages_placed = len([package for package in packages if package.placed])
     priority_ulds = len([uld for uld in ulds if uld.priority])  
 
 
-    dict = {"total_cost": cost, "priority_uld_count": priority_ulds, "packages_placed": packages_placed,     "packages": package_list}
+    dict = {"total_cost": cost, "priority_uld_count": priority_ulds, "packages_placed": packages_placed,     "lower_bound": bounds.lower_bound, "gap": bounds.gap(cost), "packages": package_list}
     return dict
+
+
+### Solving
+
+
+def manifest_from_json(
+    data,
+):  # builds (packages, ulds, priority uld cost) from a /get-coords request body
+    package_list = PackageTable.from_json(data["packages"]).packages()
+
+    uld_list = []
+    for uld in data["ulds"]:
+
+        uld_list.append(
+            ULD(
+                name=uld["name"],
+                dimensions=(uld["length"], uld["width"], uld["height"]),
+                weight_limit=uld["maxWeight"],
+            )
+        )
+
+    return package_list, uld_list, data["priority_uld_cost"]
+
+
+def solve(
+    package_list: List[Package],
+    uld_list: List[ULD],
+    priority_uld_cost: float,
+    config: PackingConfig = None,
+    progress: Progress = None,
+):  # runs the whole pipeline on the given packages and ulds and returns the output data. The packages and ulds are modified in place
+    # progress (if given) is updated as stages start and ulds get filled
+
+    if config is None:
+        config = PackingConfig()
+    if progress is None:
+        progress = Progress()
+
+    ordered_packages, ordered_ulds = package_list, uld_list
+    if config.seed is not None:  # random restart: the same manifest in a different order
+        rng = random.Random(config.seed)
+        ordered_packages, ordered_ulds = package_list.copy(), uld_list.copy()
+        rng.shuffle(ordered_packages)
+        rng.shuffle(ordered_ulds)
+
+    ulds, priority_packages, economy_packages, priority_uld_cost = get_data(
+        ordered_packages, ordered_ulds, priority_uld_cost
+    )
+
+    bounds = CostBounds(package_list, uld_list, priority_uld_cost)
+    apply_stability(ulds, config)
+
+    progress.update(stage="stack_priority_packages")
+    with metrics.timer("stack_priority_packages"):
+        last_priority_uld, remaining_ulds = stack_priority_packages(
+            ulds, priority_packages, config, progress
+        )
+
+    progress.update(stage="transition_stacking")
+    with metrics.timer("transition_stacking"):
+        remaining_economy_packages = transition_stacking(
+            last_priority_uld, DensityIndex(economy_packages), config
+        )  # the density index is shared with stack_economy_packages
+
+    progress.update(stage="stack_economy_packages")
+    with metrics.timer("stack_economy_packages"):
+        stack_economy_packages(
+            ulds, remaining_ulds, remaining_economy_packages, config, progress, bounds
+        )
+    balance_ulds(ulds)
+
+    confirm_validity(ulds, priority_packages)
+
+    progress.update(stage="return_data")
+    with metrics.timer("return_data"):
+        output_data = return_data(ulds, package_list, priority_uld_cost, bounds)
+
+    metrics.count("packages_placed", output_data["packages_placed"])
+    progress.update(packages_placed=output_data["packages_placed"])
+    progress.cost_found(output_data["total_cost"])
+    return output_data
@@ -0,0 +1,91 @@
+import numpy as np
+from typing import List
+from .package import Package
+from .uld import ULD
+
+
+def fractional_knapsack(
+    values, sizes, capacity
+):  # the most value that fits into capacity when items may be split. Items without size fit for free
+    if capacity <= 0 or len(values) == 0:
+        return 0.0
+
+    ratios = np.divide(
+        values, sizes, out=np.full(len(values), np.inf), where=sizes > 0
+    )
+    order = np.argsort(-ratios, kind="stable")
+    values, sizes = values[order], sizes[order]
+
+    filled = np.cumsum(sizes)
+    whole = int(np.searchsorted(filled, capacity, side="right"))  # items that fit entirely
+    value = values[:whole].sum()
+    if whole < len(values):
+        room = capacity - (filled[whole - 1] if whole > 0 else 0)
+        value += values[whole] * room / sizes[whole]
+    return float(value)
+
+
+def ulds_needed(capacities, demand):  # fewest of the given capacities that add up to demand, len(capacities) + 1 if they never do
+    if demand <= 0:
+        return 0
+    filled = np.cumsum(np.sort(capacities)[::-1])
+    return int(np.searchsorted(filled, demand, side="left")) + 1
+
+
+class CostBounds(object):
+
+    def __init__(
+        self, packages: List[Package], ulds: List[ULD], priority_uld_cost: float
+    ):  # lower bounds on the cost of any plan for a manifest, from volumes and weights alone
+        # priority_ulds: fewest ulds whose volume and weight can hold every priority package
+        # delay_cost: delay cost no plan can avoid. The space and weight priority packages leave is filled with economy packages as a fractional knapsack by delay cost per volume (and per weight), whatever fits in neither relaxation is lost
+        self.priority_uld_cost = priority_uld_cost
+
+        is_priority = np.array([package.is_priority for package in packages], dtype=bool)
+        volumes = np.array([package.volume for package in packages], dtype=float)
+        weights = np.array([package.weight for package in packages], dtype=float)
+        delay_costs = np.nan_to_num(
+            np.array([package.delay_cost for package in packages], dtype=float)
+        )
+        uld_volumes = np.array([uld.volume for uld in ulds], dtype=float)
+        uld_weights = np.array([uld.weight_limit for uld in ulds], dtype=float)
+
+        priority_volume = volumes[is_priority].sum()
+        priority_weight = weights[is_priority].sum()
+        self.priority_ulds = max(
+            ulds_needed(uld_volumes, priority_volume),
+            ulds_needed(uld_weights, priority_weight),
+        )
+
+        economy = ~is_priority
+        total_delay_cost = delay_costs[economy].sum()
+        packable = min(
+            fractional_knapsack(
+                delay_costs[economy],
+                volumes[economy],
+                uld_volumes.sum() - priority_volume,
+            ),
+            fractional_knapsack(
+                delay_costs[economy],
+                weights[economy],
+                uld_weights.sum() - priority_weight,
+            ),
+        )
+        self.delay_cost = max(0.0, float(total_delay_cost - packable))
+
+        self.lower_bound = self.priority_ulds * priority_uld_cost + self.delay_cost
+
+    def cost(
+        self, ulds: List[ULD], unplaced_economy_packages: List[Package]
+    ):  # what finish_packing would charge for the current state of ulds
+        delay_cost = sum(
+            package.delay_cost
+            for package in unplaced_economy_packages
+            if package.delay_cost == package.delay_cost  # NaN delay costs count as none
+        )
+        return sum(uld.priority for uld in ulds) * self.priority_uld_cost + delay_cost
+
+    def gap(self, cost):  # how far above the lower bound a cost is, relative to the cost. 0 means provably optimal
+        if cost <= 0:
+            return 0.0
+        return max(0.0, (cost - self.lower_bound) / cost)
@@ -0,0 +1,120 @@
+import os
+
+DEFAULT_ORIENTATION_ORDER = (
+    "xyz",
+    "yzx",
+    "xzy",
+    "zxy",
+    "zyx",
+)  # "yxz", the first one turned about the vertical, is left out on purpose: 3DRS trying it early placed fewer packages on the benchmark. The other portfolio orders include it
+ULD_SELECTION_HEURISTICS = ("capacity", "volume", "weight_limit")
+ECONOMY_SELECTION_MODES = ("density", "value")
+PLACEMENT_ENGINES = ("stacking", "extreme_points")
+MAX_WORKERS = (
+    int(os.environ.get("MAX_WORKERS", 0)) or os.cpu_count() or 1
+)  # most processes a request may ask for, as workers or economy_workers
+MAX_STRATEGIES = int(
+    os.environ.get("MAX_STRATEGIES", 16)
+)  # most portfolio strategies a request may ask for
+
+
+class PackingConfig(object):
+
+    def __init__(
+        self,
+        precision=10,
+        adaptive=False,
+        time_budget=None,
+        orientation_order=DEFAULT_ORIENTATION_ORDER,
+        uld_selection="capacity",
+        seed=None,
+        strategies=1,
+        workers=None,
+        gap_tolerance=None,
+        economy_selection="density",
+        placement="stacking",
+        min_support=None,
+        max_load=None,
+        cog_envelope=None,
+        economy_workers=1,
+    ):  # solver knobs. precision is the brute packing grid size (the finest one in adaptive mode), time_budget is in seconds per ULD and only used in adaptive mode
+        # orientation_order is the order 3DRS tries orientations in, uld_selection picks the UldSelector heuristic and seed (if given) shuffles the input order as a random restart
+        # economy_selection is how economy packages are picked for a uld: "density" matches the uld's remaining pseudo-density, "value" favours delay cost per share of the uld's space and weight
+        # placement picks the engine that puts packages into a uld: "stacking" is 3DRS with brute packed leftovers, "extreme_points" places every package at the best of the candidate corners drop_package keeps
+        # min_support, max_load and cog_envelope (any that are given) switch on load stability rules for every uld, see Stability
+        # gap_tolerance (if given) lets the solver skip the final brute packing sweep once the plan is within that fraction of the cost lower bound
+        # economy_workers > 1 fills ulds with economy packages that many at a time on worker processes, every uld of a wave gets its share of the packages before any of them is packed. A portfolio on more than one worker runs its strategies with economy_workers=1
+        # strategies > 1 solves a portfolio of variants of this config on workers processes and keeps the cheapest plan
+        if int(precision) < 1:
+            raise Exception("PRECISION MUST BE A NATURAL NUMBER")
+        if time_budget is not None and time_budget <= 0:
+            raise Exception("TIME BUDGET MUST BE POSITIVE")
+        if len(orientation_order) == 0 or any(
+            sorted(order) != ["x", "y", "z"] for order in orientation_order
+        ):
+            raise Exception("INVALID ORIENTATION ORDER")
+        if uld_selection not in ULD_SELECTION_HEURISTICS:
+            raise Exception("UNKNOWN ULD SELECTION HEURISTIC")
+        if int(strategies) < 1:
+            raise Exception("STRATEGIES MUST BE A NATURAL NUMBER")
+        if workers is not None and int(workers) < 1:
+            raise Exception("WORKERS MUST BE A NATURAL NUMBER")
+        if gap_tolerance is not None and not (0 <= gap_tolerance < 1):
+            raise Exception("GAP TOLERANCE MUST BE BETWEEN 0 AND 1")
+        if economy_selection not in ECONOMY_SELECTION_MODES:
+            raise Exception("UNKNOWN ECONOMY SELECTION MODE")
+        if placement not in PLACEMENT_ENGINES:
+            raise Exception("UNKNOWN PLACEMENT ENGINE")
+        if int(economy_workers) < 1:
+            raise Exception("ECONOMY WORKERS MUST BE A NATURAL NUMBER")
+        if min_support is not None and not (0 < min_support <= 1):
+            raise Exception("MIN SUPPORT MUST BE BETWEEN 0 AND 1")
+        if max_load is not None and not (max_load > 0):
+            raise Exception("MAX LOAD MUST BE POSITIVE")
+        if cog_envelope is not None and not (0 < cog_envelope <= 1):
+            raise Exception("COG ENVELOPE MUST BE BETWEEN 0 AND 1")
+
+        self.precision = int(precision)
+        self.adaptive = bool(adaptive)
+        self.time_budget = time_budget
+        self.orientation_order = tuple(orientation_order)
+        self.uld_selection = uld_selection
+        self.seed = seed
+        self.strategies = int(strategies)
+        self.workers = None if workers is None else int(workers)
+        self.gap_tolerance = None if gap_tolerance is None else float(gap_tolerance)
+        self.economy_selection = economy_selection
+        self.placement = placement
+        self.min_support = None if min_support is None else float(min_support)
+        self.max_load = None if max_load is None else float(max_load)
+        self.cog_envelope = None if cog_envelope is None else float(cog_envelope)
+        self.economy_workers = int(economy_workers)
+
+    @property
+    def stability(self):  # whether any load stability rule is on
+        return (
+            self.min_support is not None
+            or self.max_load is not None
+            or self.cog_envelope is not None
+        )
+
+    def copy(self, **changes):  # returns a new config with some settings changed
+        settings = vars(self).copy()
+        settings.update(changes)
+        return PackingConfig(**settings)
+
+    @classmethod
+    def from_json(
+        cls, data
+    ):  # reads the optional solver settings of a /get-coords request body. Process and strategy counts are capped at MAX_WORKERS and MAX_STRATEGIES, so a request cannot start any number of processes
+        defaults = cls()
+        config = cls(
+            **{
+                setting: data.get(setting, default)
+                for setting, default in vars(defaults).items()
+            }
+        )
+        config.strategies = min(config.strategies, MAX_STRATEGIES)
+        config.workers = min(config.workers or MAX_WORKERS, MAX_WORKERS)
+        config.economy_workers = min(config.economy_workers, MAX_WORKERS)
+        return config
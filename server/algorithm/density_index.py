@@ -0,0 +1,127 @@
+import bisect
+import numpy as np
+
+
+class DensityIndex(object):
+
+    def __init__(
+        self, packages
+    ):  # set of packages ordered by density, with O(log n) nearest-density lookup, removal and re-insertion. Packages can only be re-inserted if they were in the initial list
+        self.sorted_packages = sorted(packages, key=lambda package: package.density)
+        self.densities = [package.density for package in self.sorted_packages]
+        self.positions = {
+            package: idx for idx, package in enumerate(self.sorted_packages)
+        }  # package -> position in sorted order
+        n = len(self.sorted_packages)
+        self.alive = bytearray(b"\x01" * n)
+        self.size = n
+        self.tree = [0] * (n + 1)  # fenwick tree over alive flags, 1-based
+        for idx in range(1, n + 1):
+            self.tree[idx] += 1
+            parent = idx + (idx & -idx)
+            if parent <= n:
+                self.tree[parent] += self.tree[idx]
+        self.top_bit = 1 << (n.bit_length() - 1) if n > 0 else 0
+        self.total_weight = sum(package.weight for package in self.sorted_packages)
+        self.total_volume = sum(package.volume for package in self.sorted_packages)
+        self.weights = np.array(
+            [package.weight for package in self.sorted_packages], dtype=float
+        )  # columns in sorted order, for selections over every alive package at once
+        self.volumes = np.array(
+            [package.volume for package in self.sorted_packages], dtype=float
+        )
+        self.delay_costs = np.nan_to_num(
+            np.array(
+                [package.delay_cost for package in self.sorted_packages], dtype=float
+            )
+        )
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, package):
+        idx = self.positions.get(package)
+        return idx is not None and self.alive[idx] == 1
+
+    def update(self, idx, delta):  # adds delta to the alive count at sorted position idx
+        idx += 1
+        n = len(self.tree) - 1
+        while idx <= n:
+            self.tree[idx] += delta
+            idx += idx & -idx
+
+    def count_before(self, idx):  # number of alive packages at sorted positions < idx
+        total = 0
+        while idx > 0:
+            total += self.tree[idx]
+            idx -= idx & -idx
+        return total
+
+    def kth(self, k):  # sorted position of the k-th (1-based) alive package
+        idx = 0
+        bit = self.top_bit
+        n = len(self.tree) - 1
+        while bit:
+            nxt = idx + bit
+            if nxt <= n and self.tree[nxt] < k:
+                idx = nxt
+                k -= self.tree[nxt]
+            bit >>= 1
+        return idx
+
+    def remove(self, package):
+        idx = self.positions[package]
+        if not self.alive[idx]:
+            return
+        self.alive[idx] = 0
+        self.size -= 1
+        self.update(idx, -1)
+        self.total_weight -= package.weight
+        self.total_volume -= package.volume
+
+    def add(self, package):  # puts a removed package back
+        idx = self.positions[package]
+        if self.alive[idx]:
+            return
+        self.alive[idx] = 1
+        self.size += 1
+        self.update(idx, 1)
+        self.total_weight += package.weight
+        self.total_volume += package.volume
+
+    def nearest(
+        self, density
+    ):  # returns the alive package whose density is closest to the given one (the lighter one on ties), or None if empty
+        if self.size == 0:
+            return None
+
+        pos = bisect.bisect_left(self.densities, density)
+        before = self.count_before(pos)
+
+        best = None
+        if before > 0:
+            best = self.kth(before)  # densest package lighter than density
+        if before < self.size:
+            after = self.kth(before + 1)  # lightest package at least as dense
+            if best is None or (
+                self.densities[after] - density < density - self.densities[best]
+            ):
+                best = after
+
+        return self.sorted_packages[best]
+
+    def alive_positions(self):  # sorted positions of the alive packages, as an array
+        return np.flatnonzero(np.frombuffer(self.alive, dtype=np.uint8))
+
+    def packages(self):  # alive packages in ascending order of density
+        return [
+            package
+            for package, alive in zip(self.sorted_packages, self.alive)
+            if alive
+        ]
+
+
+def as_density_index(packages):  # wraps a plain list of packages, leaves a DensityIndex as it is
+    if isinstance(packages, DensityIndex):
+        return packages
+    return DensityIndex(packages)
@@ -0,0 +1,86 @@
+import numpy as np
+from typing import List
+from .package import Package
+from .uld import ULD
+from .metrics import metrics
+
+
+def prune_extreme_points(
+    uld: ULD, side
+):  # forgets candidate points that cannot take a side x side x side cube. Heights only grow, so such points stay useless for every package at least that big
+    points = np.array(list(uld.extreme_points), dtype=float).reshape(-1, 2)
+    usable = (
+        (points[:, 0] + side <= uld.dimensions["x"])
+        & (points[:, 1] + side <= uld.dimensions["y"])
+        & (
+            uld.height_map.max_heights(points[:, 0], points[:, 1], side, side) + side
+            <= uld.dimensions["z"]
+        )
+    )
+    uld.extreme_points = {
+        point: None
+        for point, keep in zip(uld.extreme_points, usable.tolist())
+        if keep
+    }
+
+
+def extreme_point_pack(
+    uld: ULD, package_list: List[Package]
+):  # places packages (priority ones first, then the biggest first) at the uld's extreme points, which drop_package keeps up to date. Returns leftovers
+    # every package is tried at all candidate points in every allowed orientation at once and goes where it rests lowest, then closest to x = 0, then closest to y = 0
+    leftovers = [package for package in package_list if not (package.placed)]
+    leftovers.sort(key=lambda package: (not (package.is_priority), -package.volume))
+    if leftovers == []:
+        return leftovers
+
+    prune_extreme_points(uld, min(package.sides[2] for package in leftovers))
+
+    unplaced = []
+    for package in leftovers:
+        if not (
+            package.weight < uld.remaining_weight_limit
+            and package.volume < uld.remaining_volume
+        ) or uld.extreme_points == {}:
+            unplaced.append(package)
+            continue
+
+        points = np.array(list(uld.extreme_points), dtype=float)
+        metrics.count("extreme_point_candidates", len(points))
+        sizes = np.array(
+            package.orientations(vertical_axis=uld.vertical_axis), dtype=float
+        )
+        xs = np.repeat(points[:, 0], len(sizes))
+        ys = np.repeat(points[:, 1], len(sizes))
+        p_x, p_y, p_z = np.tile(sizes, (len(points), 1)).T
+        if uld.stability is not None and uld.stability.cog_envelope is not None:
+            xs = np.concatenate((xs, (uld.dimensions["x"] - sizes[:, 0]) / 2))
+            ys = np.concatenate((ys, (uld.dimensions["y"] - sizes[:, 1]) / 2))
+            p_x, p_y, p_z = np.concatenate(
+                ((p_x, p_y, p_z), sizes.T), axis=1
+            )  # centred on the floor in every orientation as well, where the load stays in the envelope when it has nowhere else to go
+
+        fits = (xs + p_x <= uld.dimensions["x"]) & (ys + p_y <= uld.dimensions["y"])
+        xs, ys, p_x, p_y, p_z = xs[fits], ys[fits], p_x[fits], p_y[fits], p_z[fits]
+        zs = uld.height_map.max_heights(xs, ys, p_x, p_y)
+        feasible = np.flatnonzero(zs + p_z <= uld.dimensions["z"])
+        if len(feasible) == 0:
+            unplaced.append(package)
+            continue
+
+        ranked = feasible[np.lexsort((ys[feasible], xs[feasible], zs[feasible]))]
+        if uld.stability is None:
+            ranked = ranked[:1]  # the best drop always works, only load rules can turn one down
+        for best in ranked:
+            if uld.drop_package(
+                package,
+                float(xs[best]),
+                float(ys[best]),
+                float(p_x[best]),
+                float(p_y[best]),
+                float(p_z[best]),
+            ):
+                break
+        else:
+            unplaced.append(package)
+
+    return unplaced
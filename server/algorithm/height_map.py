@@ -0,0 +1,122 @@
+import math
+import numpy as np
+
+
+class HeightMap(object):
+
+    def __init__(
+        self, length, width, cells=16
+    ):  # spatial index over the footprints of placed packages. The base of the ULD is split into a cells x cells grid of buckets, each bucket holds the boxes whose footprint touches it
+        self.length = length
+        self.width = width
+        self.cells = cells
+        self.cell_x = length / cells if length > 0 else 1
+        self.cell_y = width / cells if width > 0 else 1
+        self.boxes = []  # contains boxes in the format [x1, y1, x2, y2, top]
+        self.box_array = np.zeros(
+            (16, 5)
+        )  # same boxes as rows of an array, for batched queries. Only the first len(self.boxes) rows are valid
+        self.buckets = {}  # (i, j) -> [highest top in bucket, [box indices]]
+
+    def cell_range(self, start, end, cell_size):  # range of bucket indices covering [start, end]
+        first = max(0, min(self.cells - 1, int(math.floor(start / cell_size))))
+        last = max(0, min(self.cells - 1, int(math.floor(end / cell_size))))
+        return range(first, last + 1)
+
+    def max_height(
+        self, x, y, p_x, p_y
+    ):  # returns the highest top among boxes whose footprint overlaps the rectangle (x, y) -> (x + p_x, y + p_y)
+        highest_point = 0
+        boxes = self.boxes
+        for i in self.cell_range(x, x + p_x, self.cell_x):
+            for j in self.cell_range(y, y + p_y, self.cell_y):
+                bucket = self.buckets.get((i, j))
+                if bucket is None or bucket[0] <= highest_point:
+                    continue  # nothing in this bucket can raise the answer
+                for idx in bucket[1]:
+                    x1, y1, x2, y2, top = boxes[idx]
+                    if (
+                        top > highest_point
+                        and (x < x2 and x + p_x > x1)
+                        and (y < y2 and y + p_y > y1)
+                    ):
+                        highest_point = top
+        return highest_point
+
+    def resting(
+        self, x, y, p_x, p_y, tolerance=1e-9
+    ):  # max_height, together with what a box there would rest on: returns (height, {box index: overlap area}) of the boxes whose top is at that height (within tolerance), in the same pass over the buckets
+        highest_point = 0
+        touching = {}  # box index -> (top, overlap area) of overlapping boxes that may be the highest
+        boxes = self.boxes
+        for i in self.cell_range(x, x + p_x, self.cell_x):
+            for j in self.cell_range(y, y + p_y, self.cell_y):
+                bucket = self.buckets.get((i, j))
+                if bucket is None or bucket[0] < highest_point - tolerance:
+                    continue
+                for idx in bucket[1]:
+                    x1, y1, x2, y2, top = boxes[idx]
+                    if (
+                        top >= highest_point - tolerance
+                        and (x < x2 and x + p_x > x1)
+                        and (y < y2 and y + p_y > y1)
+                    ):
+                        highest_point = max(highest_point, top)
+                        touching[idx] = (
+                            top,
+                            (min(x + p_x, x2) - max(x, x1))
+                            * (min(y + p_y, y2) - max(y, y1)),
+                        )
+        return highest_point, {
+            idx: overlap
+            for idx, (top, overlap) in touching.items()
+            if top >= highest_point - tolerance
+        }
+
+    def max_heights(
+        self, x, y, p_x, p_y, chunk_size=1 << 20
+    ):  # batched version of max_height. Takes equally shaped arrays of candidate rectangles and returns an array of resting heights
+        x, y, p_x, p_y = np.broadcast_arrays(
+            *(np.asarray(arr, dtype=float) for arr in (x, y, p_x, p_y))
+        )
+        shape = x.shape
+        x, y, p_x, p_y = x.ravel(), y.ravel(), p_x.ravel(), p_y.ravel()
+        heights = np.zeros(len(x))
+
+        n = len(self.boxes)
+        if n == 0:
+            return heights.reshape(shape)
+
+        x1, y1, x2, y2, top = self.box_array[:n].T
+        step = max(1, chunk_size // n)  # bounds the size of the candidates x boxes overlap matrix
+        for start in range(0, len(x), step):
+            end = start + step
+            cx, cy = x[start:end, None], y[start:end, None]
+            overlap = (
+                (cx < x2)
+                & (cx + p_x[start:end, None] > x1)
+                & (cy < y2)
+                & (cy + p_y[start:end, None] > y1)
+            )
+            heights[start:end] = np.where(overlap, top, 0).max(axis=1)
+
+        return heights.reshape(shape)
+
+    def add(self, x, y, p_x, p_y, top):  # registers a placed box in every bucket its footprint touches
+        idx = len(self.boxes)
+        self.boxes.append([x, y, x + p_x, y + p_y, top])
+        if idx == len(self.box_array):
+            self.box_array = np.concatenate((self.box_array, np.zeros_like(self.box_array)))
+        self.box_array[idx] = (x, y, x + p_x, y + p_y, top)
+        for i in self.cell_range(x, x + p_x, self.cell_x):
+            for j in self.cell_range(y, y + p_y, self.cell_y):
+                bucket = self.buckets.get((i, j))
+                if bucket is None:
+                    self.buckets[(i, j)] = [top, [idx]]
+                else:
+                    bucket[0] = max(bucket[0], top)
+                    bucket[1].append(idx)
+
+    def clear(self):
+        self.boxes.clear()
+        self.buckets.clear()
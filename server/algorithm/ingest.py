@@ -0,0 +1,144 @@
+import json
+import math
+from typing import List
+from .package_table import PackageTable
+from .uld import ULD
+
+PACKAGE_COLUMNS = ("name", "length", "width", "height", "weight", "isPriority", "delayCost")
+OPTIONAL_PACKAGE_COLUMNS = (
+    "thisSideUp",
+)  # may be left out. In CSV files a last column of "up" marks a this side up package
+ULD_COLUMNS = ("name", "length", "width", "height", "maxWeight")
+FORMATS = ("csv", "ndjson")
+
+
+def parse_measure(value, what, row):  # a finite, non-negative number, else raises
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = math.nan
+    if not (math.isfinite(number)) or number < 0:
+        raise Exception(f"INVALID {what} IN ROW {row}: {value!r}")
+    return number
+
+
+def parse_delay_cost(value, is_priority, row):  # like parseFloat in the client, but economy packages must have one
+    try:
+        delay_cost = float(value)
+    except (TypeError, ValueError):
+        delay_cost = math.nan
+    if math.isnan(delay_cost) and not (is_priority):
+        raise Exception(f"INVALID DELAY COST IN ROW {row}: {value!r}")
+    return delay_cost
+
+
+def split_rows(
+    lines, file_format, columns, optional_columns=()
+):  # yields (row number, fields in the order of columns) for every non empty line. CSV rows are split on commas like csvToJson.js does, NDJSON rows are objects keyed by the /get-coords field names
+    # optional columns come last and are None where a row leaves them out
+    if file_format not in FORMATS:
+        raise Exception(f"UNKNOWN FORMAT {file_format!r}")
+
+    for row, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line == "":
+            continue
+
+        if file_format == "csv":
+            fields = line.split(",")
+        else:
+            try:
+                record = json.loads(line)
+                fields = [record[column] for column in columns] + [
+                    record.get(column) for column in optional_columns
+                ]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                raise Exception(f"INVALID RECORD IN ROW {row}")
+
+        missing = len(columns) + len(optional_columns) - len(fields)
+        if not (0 <= missing <= len(optional_columns)):
+            raise Exception(
+                f"ROW {row} HAS {len(fields)} FIELDS, EXPECTED {len(columns)}"
+            )
+        if missing > 0:
+            fields += [None] * missing
+        yield row, fields
+
+
+def read_packages(
+    lines, file_format="csv", table: PackageTable = None, chunk_size=4096
+):  # parses package rows straight into a table (a new one unless given), validating them on the way. lines may be any iterable of text lines, e.g. a file. Rows are added to the table chunk_size at a time
+    if table is None:
+        table = PackageTable(chunk_size)
+
+    chunk = ([], [], [], [], [], [])  # names, dimensions, weights, delay costs, priorities, this side up
+    for row, (
+        name,
+        length,
+        width,
+        height,
+        weight,
+        priority,
+        delay_cost,
+        up,
+    ) in split_rows(lines, file_format, PACKAGE_COLUMNS, OPTIONAL_PACKAGE_COLUMNS):
+        if file_format == "csv":
+            is_priority = priority.strip().lower() == "priority"
+            this_side_up = up is not None and up.strip().lower() == "up"
+        else:
+            is_priority = priority is True
+            this_side_up = up is True
+
+        dimensions = (
+            parse_measure(length, "LENGTH", row),
+            parse_measure(width, "WIDTH", row),
+            parse_measure(height, "HEIGHT", row),
+        )
+        if 0 in dimensions:
+            raise Exception(f"PACKAGE IN ROW {row} HAS NO VOLUME")
+
+        chunk[0].append(str(name))
+        chunk[1].append(dimensions)
+        chunk[2].append(parse_measure(weight, "WEIGHT", row))
+        chunk[3].append(parse_delay_cost(delay_cost, is_priority, row))
+        chunk[4].append(is_priority)
+        chunk[5].append(this_side_up)
+        if len(chunk[0]) == chunk_size:
+            table.extend(*chunk)
+            chunk = ([], [], [], [], [], [])
+
+    if chunk[0] != []:
+        table.extend(*chunk)
+
+    return table
+
+
+def read_ulds(lines, file_format="csv") -> List[ULD]:  # parses uld rows, validating them on the way
+    uld_list = []
+    for row, (name, length, width, height, max_weight) in split_rows(
+        lines, file_format, ULD_COLUMNS
+    ):
+        dimensions = (
+            parse_measure(length, "LENGTH", row),
+            parse_measure(width, "WIDTH", row),
+            parse_measure(height, "HEIGHT", row),
+        )
+        if 0 in dimensions:
+            raise Exception(f"ULD IN ROW {row} HAS NO VOLUME")
+        weight_limit = parse_measure(max_weight, "MAX WEIGHT", row)
+        if weight_limit == 0:
+            raise Exception(f"ULD IN ROW {row} CANNOT CARRY ANY WEIGHT")
+
+        uld_list.append(
+            ULD(name=str(name), dimensions=dimensions, weight_limit=weight_limit)
+        )
+
+    return uld_list
+
+
+def manifest_from_files(
+    package_lines, uld_lines, priority_uld_cost, file_format="csv"
+):  # same as manifest_from_json, for the package and uld files themselves
+    package_list = read_packages(package_lines, file_format).packages()
+    uld_list = read_ulds(uld_lines, file_format)
+    return package_list, uld_list, priority_uld_cost
@@ -0,0 +1,102 @@
+import time
+import threading
+import cProfile
+import pstats
+import io
+from contextlib import contextmanager
+
+
+class Metrics(object):
+
+    def __init__(
+        self,
+    ):  # process wide counters, gauges and stage timers. Counting is a dict update under an uncontended lock, so it is cheap enough for the hot path, and does nothing while disabled. Request threads share it, so every update takes the lock. Solves on worker processes count into their own copy, which they send back as a snapshot for the parent to merge
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}  # highest value seen
+            self.timers = {}  # name -> [calls, total seconds, longest call]
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_max(self, name, value):
+        if self.enabled:
+            with self.lock:
+                if value > self.gauges.get(name, 0):
+                    self.gauges[name] = value
+
+    def record_time(self, name, seconds):
+        with self.lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    def merge(
+        self, snapshot
+    ):  # adds a snapshot taken in another process, e.g. by a solve on a worker that reset its counters when it started
+        if not self.enabled:
+            return
+        with self.lock:
+            for name, n in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            for name, value in snapshot["gauges"].items():
+                if value > self.gauges.get(name, 0):
+                    self.gauges[name] = value
+            for name, recorded in snapshot["timers"].items():
+                timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+                timer[0] += recorded["calls"]
+                timer[1] += recorded["total"]
+                timer[2] = max(timer[2], recorded["max"])
+
+    @contextmanager
+    def timer(self, name):  # times the body of a with block under name
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(name, time.perf_counter() - start)
+
+    def snapshot(self):  # json friendly copy of everything recorded so far
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timers": {
+                    name: {"calls": calls, "total": total, "max": longest}
+                    for name, (calls, total, longest) in self.timers.items()
+                },
+            }
+
+
+metrics = Metrics()  # the instance everything in the solver reports to
+
+
+@contextmanager
+def profiled(enabled=True, limit=30):  # runs the body of a with block under cProfile. The yielded dict gets the report (top functions by cumulative time) in "profile"
+    result = {}
+    if not enabled:
+        yield result
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(
+            limit
+        )
+        result["profile"] = stream.getvalue()
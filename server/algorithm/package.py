@@ -1,24 +1,113 @@
 import json
+from .package_table import PackageTable, ALL_ORIENTATIONS
 
 
 class Package(object):
 
+    __slots__ = ("table", "index")  # a package is only a view over one row of a PackageTable
+
     def __init__(
-        self, name, dimensions, weight, delay_cost, is_priority
-    ):  # dimensions is a tuple, delay cost can be anything (non integer implies priority)
-        self.name = name
-        dimensions = sorted(
-            dimensions
-        )  # since only coordinates matter, we can take x,y,z to be whatever we want within length,width,height. Nomenclature isn't important, unlike in ULDs.
-        self.dimensions = {"x": dimensions[2], "y": dimensions[1], "z": dimensions[0]}
-        self.weight = weight
-        self.delay_cost = (
-            delay_cost  # if this value is not a number, it is a priority package
+        self, name, dimensions, weight, delay_cost, is_priority, this_side_up=False
+    ):  # dimensions is a tuple, delay cost can be anything (non integer implies priority). this_side_up keeps the last dimension vertical
+        # a standalone package gets a table of its own. Use PackageTable.append / PackageTable.package for large manifests
+        self.table = PackageTable(1)
+        self.index = self.table.append(
+            name, dimensions, weight, delay_cost, is_priority, this_side_up
+        )
+        self.table.views.append(self)
+
+    @classmethod
+    def view(cls, table, index):
+        package = cls.__new__(cls)
+        package.table = table
+        package.index = index
+        return package
+
+    @property
+    def name(self):
+        return self.table.names[self.index]
+
+    @property
+    def dimensions(
+        self,
+    ):  # since only coordinates matter, we can take x,y,z to be whatever we want within length,width,height. Nomenclature isn't important, unlike in ULDs.
+        x, y, z = self.sides
+        return {"x": x, "y": y, "z": z}
+
+    @property
+    def sides(self):  # dimensions as an (x, y, z) tuple, largest first
+        dimensions, idx = self.table.dimensions, self.index
+        return (
+            dimensions.item(idx, 0),
+            dimensions.item(idx, 1),
+            dimensions.item(idx, 2),
         )
-        self.volume = self.dimensions["x"] * self.dimensions["y"] * self.dimensions["z"]
-        self.density = self.weight / self.volume
-        self.placed = False  # becomes True if package is placed inside a ULD
-        self.is_priority = is_priority
+
+    def orientations(
+        self, order=ALL_ORIENTATIONS, vertical_axis=2
+    ):  # distinct allowed orientations as (p_x, p_y, p_z) tuples, see PackageTable.orientations
+        return self.table.orientations(self.index, order, vertical_axis)
+
+    @property
+    def this_side_up(self):
+        return bool(self.table.up_side[self.index] >= 0)
+
+    @property
+    def weight(self):
+        return self.table.weight.item(self.index)
+
+    @property
+    def delay_cost(self):  # if this value is not a number, it is a priority package
+        return self.table.delay_cost.item(self.index)
+
+    @property
+    def volume(self):
+        return self.table.volume.item(self.index)
+
+    @property
+    def density(self):
+        return self.table.density.item(self.index)
+
+    @property
+    def is_priority(self):
+        return bool(self.table.is_priority[self.index])
+
+    @property
+    def placed(self):  # True if package is placed inside a ULD
+        return bool(self.table.placed[self.index])
+
+    @placed.setter
+    def placed(self, value):
+        if value:
+            self.table.placed[self.index] = True
+        else:
+            self.table.clear_placement(self.index)
+
+    @property
+    def uld(self):  # the ULD the package is placed in, or None
+        uld_idx = self.table.uld[self.index]
+        if not (self.table.placed[self.index]) or uld_idx < 0:
+            return None
+        return self.table.ulds[uld_idx]
+
+    @property
+    def position(self):  # centre of mass inside its ULD
+        return self.table.position[self.index].tolist()
+
+    @property
+    def placed_dimensions(self):  # extents along the axes of its ULD
+        return self.table.placed_dimensions[self.index].tolist()
 
     def toJson(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return json.dumps(
+            {
+                "name": self.name,
+                "dimensions": self.dimensions,
+                "weight": self.weight,
+                "delay_cost": self.delay_cost,
+                "volume": self.volume,
+                "density": self.density,
+                "placed": self.placed,
+                "is_priority": self.is_priority,
+            }
+        )
@@ -0,0 +1,213 @@
+import numpy as np
+
+ALL_ORIENTATIONS = (
+    "xyz",
+    "xzy",
+    "yxz",
+    "yzx",
+    "zxy",
+    "zyx",
+)  # every orientation of a package, as the package axis that lies along the x, y and z axis of the uld
+
+
+def orientation_pattern(
+    order, vertical_axis, up_side, sides
+):  # the permutations of sides (sorted in descending order) that orientations lists, as index triples
+    pattern = []
+    seen = []
+    for axes in order:
+        permutation = tuple("xyz".index(axis) for axis in axes)
+        if up_side >= 0 and permutation[vertical_axis] != up_side:
+            continue
+        orientation = tuple(sides[axis] for axis in permutation)
+        if orientation not in seen:
+            seen.append(orientation)
+            pattern.append(permutation)
+    return tuple(pattern)
+
+
+class PackageTable(object):
+
+    def __init__(
+        self, capacity=16
+    ):  # columnar store of packages. Row i of every column describes package i. Package objects are thin views over a row
+        capacity = max(1, capacity)
+        self.size = 0
+        self.names = []
+        self.dimensions = np.zeros(
+            (capacity, 3)
+        )  # sorted in descending order, i.e. columns are x, y, z like Package.dimensions
+        self.weight = np.zeros(capacity)
+        self.delay_cost = np.zeros(capacity)
+        self.volume = np.zeros(capacity)
+        self.density = np.zeros(capacity)
+        self.is_priority = np.zeros(capacity, dtype=bool)
+        self.up_side = np.full(
+            capacity, -1, dtype=np.int8
+        )  # index into the sorted dimensions of the side that has to stay vertical ("this side up"), -1 if any side may
+        self.placed = np.zeros(capacity, dtype=bool)
+        self.uld = np.full(
+            capacity, -1, dtype=np.int32
+        )  # index into self.ulds of the uld a package is in, -1 if it is not placed
+        self.position = np.zeros(
+            (capacity, 3)
+        )  # centre of mass of a placed package, in the frame its uld currently uses
+        self.placed_dimensions = np.zeros(
+            (capacity, 3)
+        )  # extents of a placed package along the x, y and z axes of its uld
+        self.ulds = []  # every uld that has held a package of this table
+        self.views = []  # one Package object per row, created lazily
+        self.orientation_patterns = (
+            {}
+        )  # (order, vertical axis, up side, which sides are equal) -> permutations of the sides that give distinct orientations. A handful of keys serve every row
+
+    def __len__(self):
+        return self.size
+
+    def grow(self, capacity):  # reallocates every column to hold at least capacity rows
+        if capacity <= len(self.weight):
+            return
+        capacity = max(capacity, 2 * len(self.weight))
+        for column in (
+            "dimensions",
+            "weight",
+            "delay_cost",
+            "volume",
+            "density",
+            "is_priority",
+            "up_side",
+            "placed",
+            "uld",
+            "position",
+            "placed_dimensions",
+        ):
+            old = getattr(self, column)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, column, new)
+        self.uld[self.size :] = -1
+        self.up_side[self.size :] = -1
+
+    def append(
+        self, name, dimensions, weight, delay_cost, is_priority, this_side_up=False
+    ):  # adds a package and returns its row index. dimensions are (length, width, height), this_side_up keeps the height vertical
+        idx = self.size
+        self.grow(idx + 1)
+
+        height = dimensions[2]
+        dimensions = sorted(
+            dimensions
+        )  # since only coordinates matter, we can take x,y,z to be whatever we want within length,width,height
+        if this_side_up:
+            self.up_side[idx] = 2 - dimensions.index(height)
+        self.names.append(name)
+        self.dimensions[idx] = (dimensions[2], dimensions[1], dimensions[0])
+        self.weight[idx] = weight
+        try:
+            self.delay_cost[idx] = delay_cost
+        except (TypeError, ValueError):
+            self.delay_cost[idx] = np.nan  # priority packages may not have a numeric delay cost
+        self.volume[idx] = dimensions[0] * dimensions[1] * dimensions[2]
+        self.density[idx] = weight / self.volume[idx]
+        self.is_priority[idx] = is_priority
+        self.size += 1
+        return idx
+
+    def extend(
+        self, names, dimensions, weights, delay_costs, is_priority, this_side_up=None
+    ):  # appends many packages at once. Same as append row by row, but the derived columns are computed for the whole batch
+        count = len(names)
+        start = self.size
+        self.grow(start + count)
+        rows = slice(start, start + count)
+
+        heights = np.asarray(dimensions, dtype=float).reshape(count, 3)[:, 2]
+        dimensions = -np.sort(-np.asarray(dimensions, dtype=float).reshape(count, 3))
+        if this_side_up is not None:
+            up_side = np.argmax(
+                dimensions == heights[:, None], axis=1
+            )  # any side as long as the height will do
+            self.up_side[rows] = np.where(this_side_up, up_side, -1)
+        self.names.extend(names)
+        self.dimensions[rows] = dimensions
+        self.weight[rows] = weights
+        self.delay_cost[rows] = delay_costs
+        self.volume[rows] = dimensions.prod(axis=1)
+        self.density[rows] = self.weight[rows] / self.volume[rows]
+        self.is_priority[rows] = is_priority
+        self.size += count
+
+    def package(self, idx):  # returns the Package view of a row
+        from .package import Package
+
+        while len(self.views) <= idx:
+            self.views.append(None)
+        if self.views[idx] is None:
+            self.views[idx] = Package.view(self, idx)
+        return self.views[idx]
+
+    def packages(self):  # returns views of every row, in insertion order
+        return [self.package(idx) for idx in range(self.size)]
+
+    def orientations(
+        self, idx, order=ALL_ORIENTATIONS, vertical_axis=2
+    ):  # distinct orientations of a package as (p_x, p_y, p_z) tuples, in the given order (orientations with equal extents are only listed once)
+        # vertical_axis is the uld axis that ends up pointing up. With an up side, only orientations that put it along that axis are listed
+        sides = self.dimensions[idx].tolist()
+        up_side = int(self.up_side[idx])
+        key = (order, vertical_axis, up_side, sides[0] == sides[1], sides[1] == sides[2])
+        pattern = self.orientation_patterns.get(key)
+        if pattern is None:
+            pattern = self.orientation_patterns[key] = orientation_pattern(
+                order, vertical_axis, up_side, sides
+            )
+        return [(sides[a], sides[b], sides[c]) for a, b, c in pattern]
+
+    def uld_index(self, uld):  # registers a uld if needed and returns its index in self.ulds
+        for idx, registered_uld in enumerate(self.ulds):
+            if registered_uld is uld:
+                return idx
+        self.ulds.append(uld)
+        return len(self.ulds) - 1
+
+    def record_placement(self, idx, uld, com, dimensions):  # marks a package as placed
+        self.placed[idx] = True
+        self.uld[idx] = self.uld_index(uld)
+        self.position[idx] = com
+        self.placed_dimensions[idx] = dimensions
+
+    def clear_placement(self, idx):  # marks a package as not placed
+        self.placed[idx] = False
+        self.uld[idx] = -1
+
+    @classmethod
+    def from_columns(
+        cls, names, dimensions, weight, delay_cost, volume, density, is_priority, up_side
+    ):  # builds a table over existing columns (e.g. ones in shared memory) without copying them. dimensions have to be sorted like the table keeps them. Only the placement columns are allocated, so the table has to stay the same size
+        table = cls(len(names))
+        table.size = len(names)
+        table.names = list(names)
+        table.dimensions = dimensions
+        table.weight = weight
+        table.delay_cost = delay_cost
+        table.volume = volume
+        table.density = density
+        table.is_priority = is_priority
+        table.up_side = up_side
+        return table
+
+    @classmethod
+    def from_json(
+        cls, packages
+    ):  # builds a table from the package dicts of a /get-coords request body
+        table = cls(len(packages))
+        for package in packages:
+            table.append(
+                package["name"],
+                (package["length"], package["width"], package["height"]),
+                package["weight"],
+                package["delayCost"],
+                package["isPriority"],
+                package.get("thisSideUp", False),
+            )
+        return table
@@ -0,0 +1,152 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+from . import solve, Package, ULD, PackingConfig, Progress, metrics
+from .config import ULD_SELECTION_HEURISTICS, DEFAULT_ORIENTATION_ORDER
+from .shared_manifest import SharedManifest, placement_arrays, output_from_placements
+
+ORIENTATION_ORDERS = (
+    DEFAULT_ORIENTATION_ORDER,
+    ("yzx", "xzy", "xyz", "zxy", "yxz", "zyx"),
+    ("xzy", "yzx", "xyz", "zyx", "zxy", "yxz"),
+)  # alternative orientation preferences for 3DRS, the first one is the default
+
+
+def strategy_configs(
+    config: PackingConfig,
+):  # returns config.strategies variants of config, starting with config itself. Heuristic, orientation and precision changes come first, then random restarts of config
+    variants = [config.copy(strategies=1)]
+
+    changes = [
+        {"uld_selection": heuristic}
+        for heuristic in ULD_SELECTION_HEURISTICS
+        if heuristic != config.uld_selection
+    ]
+    changes += [
+        {"orientation_order": order}
+        for order in ORIENTATION_ORDERS
+        if order != config.orientation_order
+    ]
+    changes.append({"precision": config.precision * 2})
+
+    seed = 1 if config.seed is None else config.seed + 1
+    while len(variants) < config.strategies:
+        if changes != []:
+            variants.append(config.copy(strategies=1, **changes.pop(0)))
+        else:
+            variants.append(config.copy(strategies=1, seed=seed))
+            seed += 1
+
+    return variants
+
+
+def variant_progress(
+    progress: Progress,
+):  # a counter of its own for one strategy solved in this process. It passes its stage, ulds filled and packages placed on to progress, but the best cost is left to the portfolio
+    return Progress(
+        callback=lambda state: progress.update(
+            stage=state["stage"],
+            ulds_filled=state["ulds_filled"],
+            packages_placed=state["packages_placed"],
+        )
+    )
+
+
+def run_strategy(
+    package_list: List[Package],
+    uld_list: List[ULD],
+    priority_uld_cost: float,
+    config: PackingConfig,
+    progress: Progress = None,
+):  # runs one strategy on its own copy of the manifest. Returns the output data, or the exception that stopped it
+    try:
+        return solve(package_list, uld_list, priority_uld_cost, config, progress)
+    except Exception as e:
+        return e
+
+
+def run_shared_strategy(
+    manifest_name, config: PackingConfig
+):  # runs one strategy in a worker process on the shared manifest of that name. Returns its placement arrays with the metrics snapshot of the solve in "metrics", or the exception that stopped it
+    metrics.reset()
+    shared = SharedManifest.attach(manifest_name)
+    try:
+        package_list, uld_list, priority_uld_cost = shared.manifest()
+        result = run_strategy(package_list, uld_list, priority_uld_cost, config)
+        if isinstance(result, Exception):
+            return result
+        placements = placement_arrays(
+            package_list, uld_list, result
+        )  # copies, so nothing returned points into the block
+        placements["metrics"] = metrics.snapshot()
+        return placements
+    finally:
+        shared.close()
+
+
+def solve_portfolio(
+    package_list: List[Package],
+    uld_list: List[ULD],
+    priority_uld_cost: float,
+    config: PackingConfig,
+    progress: Progress = None,
+):  # solves every strategy of config in a process pool and returns the output data with the lowest total cost (the earliest strategy on ties)
+    # progress (if given) follows the solves run in this process and the best cost found so far
+    if progress is None:
+        progress = Progress()
+
+    if config.strategies == 1:
+        return solve(package_list, uld_list, priority_uld_cost, config, progress)
+
+    variants = strategy_configs(config)
+    workers = min(len(variants), config.workers or os.cpu_count() or 1)
+    if workers > 1:
+        variants = [
+            variant.copy(economy_workers=1) for variant in variants
+        ]  # every strategy process would start a pool of its own, so a request could run workers times economy_workers processes
+
+    if workers == 1:
+        results = [
+            run_strategy(
+                *copy.deepcopy((package_list, uld_list)),
+                priority_uld_cost,
+                variant,
+                variant_progress(progress),
+            )
+            for variant in variants
+        ]
+        for result in results:
+            if not isinstance(result, Exception):
+                progress.cost_found(result["total_cost"])
+    else:
+        with SharedManifest.create(
+            package_list, uld_list, priority_uld_cost
+        ) as shared, ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_shared_strategy, shared.name, variant)
+                for variant in variants
+            ]  # workers attach to the manifest instead of getting a pickled copy, and only send back placement arrays
+            progress.update(stage="portfolio")
+            for future in as_completed(futures):
+                result = future.result()
+                if not isinstance(result, Exception):
+                    progress.cost_found(result["total_cost"])
+            results = [future.result() for future in futures]
+        for result in results:
+            if not isinstance(result, Exception):
+                metrics.merge(result.pop("metrics"))
+        results = [
+            (
+                result
+                if isinstance(result, Exception)
+                else output_from_placements(package_list, uld_list, result)
+            )
+            for result in results
+        ]
+
+    plans = [result for result in results if not isinstance(result, Exception)]
+    if plans == []:
+        raise results[0]
+
+    return min(plans, key=lambda output_data: output_data["total_cost"])
@@ -0,0 +1,34 @@
+class Progress(object):
+
+    def __init__(
+        self, callback=None
+    ):  # tracks how far a solve has come. callback (if given) is called with the state as a dict after every update, e.g. to publish it to another process
+        self.callback = callback
+        self.stage = "queued"
+        self.ulds_filled = 0
+        self.packages_placed = 0
+        self.best_cost = None
+
+    def to_json(self):
+        return {
+            "stage": self.stage,
+            "ulds_filled": self.ulds_filled,
+            "packages_placed": self.packages_placed,
+            "best_cost": self.best_cost,
+        }
+
+    def update(self, **changes):
+        for key, value in changes.items():
+            setattr(self, key, value)
+        if self.callback is not None:
+            self.callback(self.to_json())
+
+    def uld_filled(self, ulds):  # called after a uld has been packed, with every uld of the solve
+        self.update(
+            ulds_filled=self.ulds_filled + 1,
+            packages_placed=sum(len(uld.placed_packages) for uld in ulds),
+        )
+
+    def cost_found(self, cost):  # called with the total cost of every finished plan, keeps the lowest
+        if self.best_cost is None or cost < self.best_cost:
+            self.update(best_cost=cost)
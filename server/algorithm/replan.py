@@ -0,0 +1,170 @@
+from typing import List
+from . import (
+    Package,
+    ULD,
+    PackingConfig,
+    DensityIndex,
+    fill_leftovers,
+    apply_stability,
+    balance_ulds,
+    transition_stacking,
+    stack_priority_packages,
+    stack_economy_packages,
+    confirm_validity,
+    return_data,
+)
+
+
+def restore_plan(
+    package_list: List[Package], uld_list: List[ULD], plan_packages
+):  # drops the packages of a previous plan back where they were, lowest first, so they settle if something under them is gone. plan_packages is the "packages" list of its output data
+    # returns {uld: [(package, (x, y, p_x, p_y, p_z)), ...]} of everything that was restored
+    packages_by_name = {}
+    for package in package_list:
+        packages_by_name.setdefault(package.name, []).append(package)
+    ulds_by_name = {uld.name: uld for uld in uld_list}
+
+    placements = []
+    for entry in plan_packages:
+        candidates = packages_by_name.get(entry["name"])
+        uld = ulds_by_name.get(entry["uld"])
+        if not candidates or uld is None or not entry["is_placed"]:
+            continue
+        package = candidates.pop(0)  # names may repeat, take them in order
+        x1, y1, z1 = entry["reference_corner"]
+        x2, y2, z2 = entry["diagonally_opposite_corner"]
+        placements.append((z1, uld, package, (x1, y1, x2 - x1, y2 - y1, z2 - z1)))
+
+    for uld in {placement[1] for placement in placements}:
+        uld.use_real_frame()
+
+    restored = {}
+    placements.sort(key=lambda placement: placement[0])
+    for _, uld, package, drop in placements:
+        if uld.drop_package(package, *drop):
+            restored.setdefault(uld, []).append((package, drop))
+
+    return restored
+
+
+def repack_affected_uld(
+    uld: ULD, restored, economy_index: DensityIndex, config: PackingConfig
+):  # re-stacks a uld that lost packages together with waiting economy packages through transition_stacking. If that would leave out a package the uld already held, the restored placements are put back instead
+    if uld.remaining_volume <= 0 or uld.remaining_weight_limit <= 0:
+        return
+
+    transition_stacking(uld, economy_index, config)
+    if all(package.placed for package, _ in restored):
+        return
+
+    restored_packages = {package for package, _ in restored}
+    for package in uld.placed_packages:
+        if package not in restored_packages:
+            economy_index.add(package)  # it came from the index
+    uld.empty()
+    for package, drop in restored:
+        uld.drop_package(package, *drop)
+
+
+def make_room_for_priority(
+    uld: ULD,
+    priority_packages: List[Package],
+    economy_index: DensityIndex,
+    config: PackingConfig,
+):  # takes the economy packages out of a priority uld, brute packs priority packages into it and lets the economy packages back into what is left. Returns the priority leftovers
+    kept = []
+    evicted = []
+    for package in uld.placed_packages:
+        if package.is_priority:
+            (x, y, _), (p_x, p_y, p_z) = package.position, package.placed_dimensions
+            kept.append((package, (x - p_x / 2, y - p_y / 2, p_x, p_y, p_z)))
+        else:
+            evicted.append(package)
+    if evicted == []:
+        return priority_packages
+
+    uld.empty()
+    for package, drop in kept:
+        if not (uld.drop_package(package, *drop)):
+            priority_packages = priority_packages + [
+                package
+            ]  # load rules can turn down a package that lost the economy packages under it
+    leftovers = fill_leftovers(uld, priority_packages, config)
+    for package in fill_leftovers(uld, evicted, config):
+        economy_index.add(package)
+
+    return leftovers
+
+
+def replan(
+    package_list: List[Package],
+    uld_list: List[ULD],
+    priority_uld_cost: float,
+    plan_packages,
+    changed_ulds=(),
+    config: PackingConfig = None,
+):  # updates a previous plan for a changed manifest instead of solving it again. package_list and uld_list describe the new manifest, plan_packages is the "packages" list of the previous output data
+    # ulds named in changed_ulds (e.g. ones that lost packages) are re-stacked with waiting economy packages. Whatever is left then goes into free space of used ulds first, and only then into empty ulds. Priority packages that do not fit push economy packages out of priority ulds before a new uld is opened for them
+    if config is None:
+        config = PackingConfig()
+
+    apply_stability(uld_list, config)  # restored placements have to pass its rules too
+    restored = restore_plan(package_list, uld_list, plan_packages)
+
+    waiting = [package for package in package_list if not (package.placed)]
+    waiting_priority = [package for package in waiting if package.is_priority]
+    economy_index = DensityIndex(
+        [package for package in package_list if not (package.is_priority)]
+    )  # holds every economy package, so evicted ones can be added back
+    for package in package_list:
+        if package.placed and not (package.is_priority):
+            economy_index.remove(package)
+
+    for uld in uld_list:
+        if uld.name in changed_ulds and uld in restored:
+            repack_affected_uld(uld, restored[uld], economy_index, config)
+
+    used_ulds = [uld for uld in uld_list if uld.placed_packages != []]
+    empty_ulds = [uld for uld in uld_list if uld.placed_packages == []]
+    used_ulds.sort(key=lambda uld: not uld.priority)  # priority ulds first, adding to them is free
+
+    for uld in used_ulds:
+        waiting_priority = fill_leftovers(uld, waiting_priority, config)
+    for uld in used_ulds:
+        if waiting_priority != [] and uld.priority:
+            waiting_priority = make_room_for_priority(
+                uld, waiting_priority, economy_index, config
+            )
+    opened_ulds = []
+    if waiting_priority != []:
+        _, still_empty = stack_priority_packages(empty_ulds, waiting_priority, config)
+        opened_ulds = [uld for uld in empty_ulds if uld not in still_empty]
+        empty_ulds = still_empty
+        used_ulds = (
+            opened_ulds + used_ulds
+        )  # the priority ulds stack_priority_packages opened come first, their free space costs nothing more
+
+    left_out = {entry["name"] for entry in plan_packages if not (entry["is_placed"])}
+    for uld in used_ulds:
+        if uld.name in changed_ulds or uld in opened_ulds:
+            candidates = economy_index.packages()
+        else:  # packages the previous plan left out already failed to fit here
+            candidates = [
+                package
+                for package in economy_index.packages()
+                if package.name not in left_out
+            ]
+        fill_leftovers(uld, candidates, config)
+        for package in candidates:
+            if package.placed:
+                economy_index.remove(package)
+    stack_economy_packages(
+        empty_ulds.copy(), empty_ulds, economy_index, config
+    )  # its final sweep only needs to cover the ulds it opens
+    balance_ulds(uld_list)
+
+    confirm_validity(
+        uld_list, [package for package in package_list if package.is_priority]
+    )
+
+    return return_data(uld_list, package_list, priority_uld_cost)
@@ -0,0 +1,273 @@
+import struct
+import numpy as np
+from multiprocessing import shared_memory
+from typing import List
+from .package import Package
+from .package_table import PackageTable
+from .uld import ULD
+
+PACKAGE_COLUMNS = (
+    "dimensions",
+    "weight",
+    "delay_cost",
+    "volume",
+    "density",
+    "is_priority",
+    "up_side",
+)  # the PackageTable columns a shared manifest holds
+HEADER = struct.Struct(
+    "<QQQQd"
+)  # package count, uld count, bytes of package names, bytes of uld names, priority uld cost
+
+
+def layout(
+    package_count, uld_count, package_name_bytes, uld_name_bytes
+):  # where every column lives in the buffer: name -> (offset, dtype, shape). Every column starts on an 8 byte boundary
+    columns = (
+        ("dimensions", np.float64, (package_count, 3)),
+        ("weight", np.float64, (package_count,)),
+        ("delay_cost", np.float64, (package_count,)),
+        ("volume", np.float64, (package_count,)),
+        ("density", np.float64, (package_count,)),
+        ("is_priority", np.bool_, (package_count,)),
+        ("up_side", np.int8, (package_count,)),
+        ("package_name_offsets", np.int64, (package_count + 1,)),
+        ("package_names", np.uint8, (package_name_bytes,)),
+        ("uld_dimensions", np.float64, (uld_count, 3)),  # real dimensions
+        ("uld_weight_limit", np.float64, (uld_count,)),
+        ("uld_name_offsets", np.int64, (uld_count + 1,)),
+        ("uld_names", np.uint8, (uld_name_bytes,)),
+    )
+
+    offsets = {}
+    offset = HEADER.size
+    for name, dtype, shape in columns:
+        offset += -offset % 8
+        offsets[name] = (offset, dtype, shape)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return offsets, offset
+
+
+def encode_names(names):  # (utf-8 bytes of all names, offsets where each one starts and the last one ends)
+    encoded = [str(name).encode() for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets
+
+
+def decode_names(data, offsets):
+    data = bytes(data)
+    offsets = offsets.tolist()
+    return [
+        data[offsets[i] : offsets[i + 1]].decode() for i in range(len(offsets) - 1)
+    ]
+
+
+def package_columns(
+    package_list: List[Package],
+):  # the table columns of package_list in its order. Straight slices when it is a whole table in order, as manifest_from_json builds
+    table = package_list[0].table if package_list != [] else None
+    indices = [package.index for package in package_list]
+    if (
+        table is not None
+        and all(package.table is table for package in package_list)
+        and indices == list(range(table.size))
+    ):
+        return {column: getattr(table, column)[: table.size] for column in PACKAGE_COLUMNS}
+
+    return {
+        "dimensions": [package.sides for package in package_list],
+        "weight": [package.weight for package in package_list],
+        "delay_cost": [package.delay_cost for package in package_list],
+        "volume": [package.volume for package in package_list],
+        "density": [package.density for package in package_list],
+        "is_priority": [package.is_priority for package in package_list],
+        "up_side": [package.table.up_side[package.index] for package in package_list],
+    }
+
+
+class SharedManifest(object):
+
+    def __init__(
+        self, memory: shared_memory.SharedMemory, owner=False
+    ):  # a manifest laid out in one shared memory block, so worker processes can attach to it by name instead of unpickling packages and ulds. Use create in the parent and attach in workers
+        self.memory = memory
+        self.owner = owner  # the owner unlinks the block when it is closed
+        (
+            self.package_count,
+            self.uld_count,
+            package_name_bytes,
+            uld_name_bytes,
+            self.priority_uld_cost,
+        ) = HEADER.unpack_from(memory.buf, 0)
+        offsets, _ = layout(
+            self.package_count, self.uld_count, package_name_bytes, uld_name_bytes
+        )
+        self.columns = {
+            name: np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset)
+            for name, (offset, dtype, shape) in offsets.items()
+        }  # views straight into the block
+
+    @property
+    def name(self):  # what workers attach by
+        return self.memory.name
+
+    @classmethod
+    def create(
+        cls, package_list: List[Package], uld_list: List[ULD], priority_uld_cost: float
+    ):  # copies a manifest into a new shared memory block
+        package_names, package_name_offsets = encode_names(
+            package.name for package in package_list
+        )
+        uld_names, uld_name_offsets = encode_names(uld.name for uld in uld_list)
+        _, size = layout(
+            len(package_list), len(uld_list), len(package_names), len(uld_names)
+        )
+
+        memory = shared_memory.SharedMemory(create=True, size=max(1, size))
+        HEADER.pack_into(
+            memory.buf,
+            0,
+            len(package_list),
+            len(uld_list),
+            len(package_names),
+            len(uld_names),
+            priority_uld_cost,
+        )
+        shared = cls(memory, owner=True)
+
+        columns = package_columns(package_list)
+        columns.update(
+            package_name_offsets=package_name_offsets,
+            package_names=np.frombuffer(package_names, dtype=np.uint8),
+            uld_dimensions=[
+                (
+                    uld.real_dimensions["x"],
+                    uld.real_dimensions["y"],
+                    uld.real_dimensions["z"],
+                )
+                for uld in uld_list
+            ],
+            uld_weight_limit=[uld.weight_limit for uld in uld_list],
+            uld_name_offsets=uld_name_offsets,
+            uld_names=np.frombuffer(uld_names, dtype=np.uint8),
+        )
+        for name, values in columns.items():
+            if len(values) > 0:
+                shared.columns[name][...] = values
+        return shared
+
+    @classmethod
+    def attach(cls, name):  # opens a block another process created
+        return cls(shared_memory.SharedMemory(name=name))
+
+    def manifest(
+        self,
+    ):  # (packages, ulds, priority uld cost) like manifest_from_json. The packages read their dimensions, weights, delay costs and flags from the block without copying, only names and placements are process local. They are valid until close
+        columns = self.columns
+        for name in PACKAGE_COLUMNS:
+            columns[name].flags.writeable = False  # shared with every other worker
+        table = PackageTable.from_columns(
+            decode_names(columns["package_names"], columns["package_name_offsets"]),
+            columns["dimensions"],
+            columns["weight"],
+            columns["delay_cost"],
+            columns["volume"],
+            columns["density"],
+            columns["is_priority"],
+            columns["up_side"],
+        )
+
+        uld_list = [
+            ULD(name=name, dimensions=tuple(dimensions), weight_limit=weight_limit)
+            for name, dimensions, weight_limit in zip(
+                decode_names(columns["uld_names"], columns["uld_name_offsets"]),
+                columns["uld_dimensions"].tolist(),
+                columns["uld_weight_limit"].tolist(),
+            )
+        ]
+        return table.packages(), uld_list, self.priority_uld_cost
+
+    def close(
+        self,
+    ):  # unmaps the block in this process, the owner also frees it. Packages from manifest must not be used after that, their columns point into the block
+        self.columns = {}
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def placement_arrays(
+    package_list: List[Package], uld_list: List[ULD], output_data
+):  # the compact form of a solved manifest to send back to the parent: the scalar results of output_data, plus per package the index of its uld in uld_list (-1 if not placed) and both corners as one (packages, 6) array
+    if package_list == []:
+        table, rows = None, []
+    else:
+        table = package_list[0].table
+        rows = [package.index for package in package_list]
+
+    uld_indices = np.full(len(package_list), -1, dtype=np.int32)
+    corners = np.zeros((len(package_list), 6))
+    if table is not None:
+        index_of = {id(uld): idx for idx, uld in enumerate(uld_list)}
+        table_to_list = np.array(
+            [index_of.get(id(uld), -1) for uld in table.ulds] + [-1], dtype=np.int32
+        )  # the extra -1 is where table.uld's -1 lands
+        placed = table.placed[rows]
+        uld_indices = np.where(placed, table_to_list[table.uld[rows]], -1).astype(
+            np.int32
+        )
+        position, dimensions = table.position[rows], table.placed_dimensions[rows]
+        corners[:, :3] = position - dimensions / 2
+        corners[:, 3:] = position + dimensions / 2
+
+    placements = {
+        key: value for key, value in output_data.items() if key != "packages"
+    }
+    placements.update(uld=uld_indices, corners=corners)
+    return placements
+
+
+def output_from_placements(
+    package_list: List[Package], uld_list: List[ULD], placements
+):  # turns placement_arrays back into output data for the parent's own packages and ulds, the same as solve would have returned
+    packages = []
+    for package, uld_index, corners in zip(
+        package_list, placements["uld"].tolist(), placements["corners"].tolist()
+    ):
+        if uld_index < 0:
+            packages.append(
+                {
+                    "name": package.name,
+                    "is_priority": package.is_priority,
+                    "is_placed": False,
+                    "uld": None,
+                    "reference_corner": None,
+                    "diagonally_opposite_corner": None,
+                }
+            )
+        else:
+            packages.append(
+                {
+                    "name": package.name,
+                    "is_priority": package.is_priority,
+                    "is_placed": True,
+                    "uld": uld_list[uld_index].name,
+                    "reference_corner": corners[:3],
+                    "diagonally_opposite_corner": corners[3:],
+                }
+            )
+
+    output_data = {
+        key: value
+        for key, value in placements.items()
+        if key not in ("uld", "corners")
+    }
+    output_data["packages"] = packages
+    return output_data
@@ -0,0 +1,135 @@
+import heapq
+
+
+class Stability(object):
+
+    def __init__(
+        self,
+        length,
+        width,
+        weight_limit,
+        min_support=None,
+        max_load=None,
+        cog_envelope=None,
+    ):  # load rules for one uld, checked on every drop and kept up to date as packages are committed, so no drop rescans the load. Rules left as None are not checked
+        # min_support: least fraction of a package's base that has to rest on the floor or on tops at its resting height
+        # max_load: most weight per unit of top area a package may carry, counting everything stacked on it
+        # cog_envelope: fraction of the uld's length and width, centred on the floor, its centre of gravity has to stay in. An economy package may not leave it outside the envelope, or further outside than it was. A priority package only may not push the moment about the centre past what the full weight limit would have at the edge of the envelope, so priority packages can still be loaded from a corner. ULD.balance then takes economy packages out of a finished load they left outside, as far as that helps
+        self.length = length
+        self.width = width
+        self.weight_limit = weight_limit
+        self.min_support = min_support
+        self.max_load = max_load
+        self.cog_envelope = cog_envelope
+
+        self.loads = {}  # package -> weight resting on its top, passed down from everything above
+        self.supports = (
+            {}
+        )  # package -> (bottom height, top area, [(supporting package, share of its weight), ...])
+        self.weight = 0.0
+        self.moment_x = 0.0  # sum of weight times distance from the floor centre, along x
+        self.moment_y = 0.0
+
+    def check(
+        self, package, x, y, p_x, p_y, z, resting_on
+    ):  # returns what committing the drop would change, or None if it breaks a rule. resting_on is [(package, overlap area), ...] of the tops the package would sit on (empty on the floor)
+        area = p_x * p_y
+        if z > 0:
+            supported = sum(overlap for _, overlap in resting_on)
+            if supported <= 0:
+                return None
+            if self.min_support is not None and supported < self.min_support * area:
+                return None
+            shares = [(below, overlap / supported) for below, overlap in resting_on]
+        else:
+            shares = []
+
+        added = self.added_loads(package.weight, shares)
+        if self.max_load is not None:
+            for below, load in added.items():
+                if (self.loads[below] + load) > self.max_load * self.supports[below][1]:
+                    return None
+
+        moment_x = self.moment_x + package.weight * (x + p_x / 2 - self.length / 2)
+        moment_y = self.moment_y + package.weight * (y + p_y / 2 - self.width / 2)
+        if self.cog_envelope is not None:
+            if package.is_priority:  # they have to go somewhere, see cog_envelope
+                limit = self.cog_envelope * self.weight_limit / 2
+                if (
+                    abs(moment_x) > limit * self.length
+                    or abs(moment_y) > limit * self.width
+                ):
+                    return None
+            elif self.outside(
+                moment_x, moment_y, self.weight + package.weight
+            ) > self.outside(self.moment_x, self.moment_y, self.weight):
+                return None
+
+        return (package, (z, area, shares), added, moment_x, moment_y)
+
+    def added_loads(
+        self, weight, shares
+    ):  # how much more every package under a new one carries. Weight is split over the supports by overlap area and passed down level by level, highest first, so each package is visited once
+        added = {}
+        pending = []
+        for below, share in shares:
+            if below not in added:
+                heapq.heappush(pending, (-self.supports[below][0], id(below), below))
+            added[below] = added.get(below, 0.0) + weight * share
+
+        while pending != []:
+            _, _, package = heapq.heappop(pending)
+            for below, share in self.supports[package][2]:
+                if below not in added:
+                    heapq.heappush(
+                        pending, (-self.supports[below][0], id(below), below)
+                    )
+                added[below] = added.get(below, 0.0) + added[package] * share
+        return added
+
+    def commit(self, change):  # applies what check returned
+        package, support, added, moment_x, moment_y = change
+        for below, load in added.items():
+            self.loads[below] += load
+        self.loads[package] = 0.0
+        self.supports[package] = support
+        self.weight += package.weight
+        self.moment_x, self.moment_y = moment_x, moment_y
+
+    def outside(
+        self, moment_x, moment_y, weight
+    ):  # how far a load with these moments about the floor centre and this weight has its centre of gravity outside the cog_envelope, as the moment beyond its edge over the length plus the same over the width. 0 inside it
+        limit = self.cog_envelope * weight / 2
+        return (
+            max(abs(moment_x) - limit * self.length, 0) / self.length
+            + max(abs(moment_y) - limit * self.width, 0) / self.width
+        )
+
+    def excess(
+        self, without=None
+    ):  # outside for the committed load. without (a committed package) is left out of it
+        moment_x, moment_y, weight = self.moment_x, self.moment_y, self.weight
+        if without is not None:
+            x, y, _ = without.position
+            moment_x -= without.weight * (x - self.length / 2)
+            moment_y -= without.weight * (y - self.width / 2)
+            weight -= without.weight
+        return self.outside(moment_x, moment_y, weight)
+
+    def supporting(self):  # every committed package something rests on
+        return {
+            below for _, _, shares in self.supports.values() for below, _ in shares
+        }
+
+    def centre_of_gravity(self):  # (x, y) of the load, None while the uld is empty
+        if self.weight <= 0:
+            return None
+        return (
+            self.length / 2 + self.moment_x / self.weight,
+            self.width / 2 + self.moment_y / self.weight,
+        )
+
+    def clear(self):
+        self.loads.clear()
+        self.supports.clear()
+        self.weight = self.moment_x = self.moment_y = 0.0
@@ -1,5 +1,8 @@
 import json
+import numpy as np
 from .utils import log
+from .height_map import HeightMap
+from .metrics import metrics
 
 
 class ULD(object):
@@ -19,12 +22,31 @@ class ULD(object):
         self.weight_limit = weight_limit
         self.volume = self.dimensions["x"] * self.dimensions["y"] * self.dimensions["z"]
         self.pseudo_density = self.weight_limit / self.volume
-        self.packages = (
+        self.placed_packages = (
             []
-        )  # contains packages in the format [package, [COM], [dimensions]]. We will create packages with respect to sorted dimensions, and then rotate them all in the end.
+        )  # packages in drop order. Their COM and dimensions live in their PackageTable. We will create packages with respect to sorted dimensions, and then rotate them all in the end.
         self.remaining_weight_limit = self.weight_limit
         self.remaining_volume = self.volume
         self.priority = False  # turns on if theres at least one priority package
+        self.height_map = HeightMap(
+            self.dimensions["x"], self.dimensions["y"]
+        )  # spatial index of placed footprints, used to find resting heights without scanning every package
+        self.extreme_points = {
+            (0, 0): None
+        }  # candidate (x, y) corners for the extreme point engine, in insertion order. Every committed box adds the corners next to it
+        self.vertical_axis = self.real_frame_transform()[0][
+            2
+        ]  # the axis of the packing frame that points up once the uld is rotated back, "this side up" packages keep their up side along it
+        self.stability = None  # load rules every drop is checked against, see set_stability
+
+    @property
+    def packages(
+        self,
+    ):  # contains packages in the format [package, [COM], [dimensions]], built from the package table
+        return [
+            [package, package.position, package.placed_dimensions]
+            for package in self.placed_packages
+        ]
 
     def __str__(self):
         formatted_packages = []
@@ -56,10 +78,12 @@ class ULD(object):
     def drop_package(
         self, package, x, y, p_x, p_y, p_z, real_drop=False
     ):  # xy are the desired coordinates and px,py,pz are dimensions. real_drop = True means dropping into correct dimensions
+        metrics.count("drop_package_calls")
+
         if real_drop:
-            dim = self.real_dimensions.copy()
+            dim = self.real_dimensions
         else:
-            dim = self.dimensions.copy()
+            dim = self.dimensions
 
         if not (
             (0 <= x <= dim["x"])
@@ -69,144 +93,273 @@ class ULD(object):
             and package.weight < self.remaining_weight_limit
             and package.volume < self.remaining_volume
         ):
+            metrics.count("rejected_drops")
             return False
 
-        highest_point = 0  # we will find the package that has the highest z that occupies x,y. package is the object
-        for package_details in self.packages:
-            com, axes = package_details[1], package_details[2]
-            x1, x2, y1, y2, high_point = (
-                com[0] - axes[0] / 2,
-                com[0] + axes[0] / 2,
-                com[1] - axes[1] / 2,
-                com[1] + axes[1] / 2,
-                com[2] + axes[2] / 2,
-            )
-            if (x < x2 and x + p_x > x1) and (y < y2 and y + p_y > y1):
-                highest_point = max(highest_point, high_point)
+        if self.stability is None:
+            highest_point = self.height_map.max_height(
+                x, y, p_x, p_y
+            )  # the highest z among packages that occupy the footprint at x,y
+        else:
+            highest_point, touching = self.height_map.resting(x, y, p_x, p_y)
 
         z = highest_point
 
         if not ((0 <= z <= dim["z"]) and (0 <= z + p_z <= dim["z"])):
+            metrics.count("rejected_drops")
             return False
-        else:
-            self.packages.append(
-                [package, [x + p_x / 2, y + p_y / 2, z + p_z / 2], [p_x, p_y, p_z]]
+
+        if self.stability is not None:
+            change = self.stability.check(
+                package,
+                x,
+                y,
+                p_x,
+                p_y,
+                z,
+                [
+                    (self.placed_packages[idx], overlap)
+                    for idx, overlap in touching.items()
+                ],  # height map boxes are in drop order
             )
-            package.placed = True
-            self.remaining_weight_limit -= package.weight
-            self.remaining_volume -= package.volume
-            if package.is_priority:
-                self.priority = True
-                log("PRIORITY", self.name)
-                
-            return True
+            if change is None:
+                metrics.count("unstable_drops")
+                return False
+            self.stability.commit(change)
+
+        package.table.record_placement(
+            package.index,
+            self,
+            (x + p_x / 2, y + p_y / 2, z + p_z / 2),
+            (p_x, p_y, p_z),
+        )
+        self.placed_packages.append(package)
+        self.height_map.add(x, y, p_x, p_y, z + p_z)
+        self.add_extreme_points(x, y, p_x, p_y)
+        self.remaining_weight_limit -= package.weight
+        self.remaining_volume -= package.volume
+        if package.is_priority:
+            self.priority = True
+            log("PRIORITY", self.name, "DEBUG")
+            
+        return True
+
+    def add_extreme_points(
+        self, x, y, p_x, p_y
+    ):  # corners a box at x, y opens up: beside it, behind it, and both projected onto the walls. Points on top of it are the box's own corner, which stays a candidate
+        for point in ((x + p_x, y), (x, y + p_y), (x + p_x, 0), (0, y + p_y)):
+            self.extreme_points.setdefault(point, None)
 
     def raw_drop(
         self, x, y, package
     ):  # also drops the package, but in a non-fixed orientation. Only good for brute packing or debugging
 
-        a, b, c = (
-            package.dimensions["x"],
-            package.dimensions["y"],
-            package.dimensions["z"],
-        )
+        for p_x, p_y, p_z in package.orientations(vertical_axis=self.vertical_axis):
+            if self.drop_package(package, x, y, p_x, p_y, p_z):
+                return True
+
+        return False
+
+    def batched_raw_drop(
+        self, xs, ys, package
+    ):  # same as raw_drop, but tries every (x, y) in the given arrays and every orientation in one batched pass. Drops the package at the first feasible candidate (in the order of xs/ys, then orientation) and returns True, else False
+        if not (
+            package.weight < self.remaining_weight_limit
+            and package.volume < self.remaining_volume
+        ):
+            return False
+
+        orientations = np.array(
+            package.orientations(vertical_axis=self.vertical_axis), dtype=float
+        )  # same order as raw_drop
 
-        if self.drop_package(package, x, y, a, b, c):
-            return True
-        if self.drop_package(package, x, y, a, c, b):
-            return True
-        if self.drop_package(package, x, y, b, a, c):
-            return True
-        if self.drop_package(package, x, y, b, c, a):
-            return True
-        if self.drop_package(package, x, y, c, a, b):
-            return True
-        if self.drop_package(package, x, y, c, b, a):
-            return True
+        xs = np.asarray(xs, dtype=float)[:, None]
+        ys = np.asarray(ys, dtype=float)[:, None]
+        p_x, p_y, p_z = orientations[:, 0], orientations[:, 1], orientations[:, 2]
 
+        fits = (
+            (xs >= 0)
+            & (xs + p_x <= self.dimensions["x"])
+            & (ys >= 0)
+            & (ys + p_y <= self.dimensions["y"])
+        )  # candidates x orientations
+        if not fits.any():
+            return False
+
+        candidate_idx, orientation_idx = np.nonzero(fits)  # row-major, so candidate order is kept
+        heights = self.height_map.max_heights(
+            xs[candidate_idx, 0],
+            ys[candidate_idx, 0],
+            p_x[orientation_idx],
+            p_y[orientation_idx],
+        )
+        feasible = heights + p_z[orientation_idx] <= self.dimensions["z"]
+        if not feasible.any():
+            return False
+
+        if self.stability is None:
+            candidates = [np.argmax(feasible)]  # the first feasible drop always works
+        else:
+            candidates = np.flatnonzero(feasible)  # the load rules may turn some down
+        for candidate in candidates:
+            i, o = candidate_idx[candidate], orientation_idx[candidate]
+            if self.drop_package(
+                package,
+                float(xs[i, 0]),
+                float(ys[i, 0]),
+                float(p_x[o]),
+                float(p_y[o]),
+                float(p_z[o]),
+            ):
+                return True
         return False
 
-    def rotate_ULD(self):
+    def real_frame_transform(
+        self,
+    ):  # returns (perm, reflected): real axis i is sorted axis perm[i], and if the permutation is odd, the real axis reflected is mirrored so that the whole map is a rotation (None otherwise)
+        # with ties between dimensions an axis keeps its own sorted axis when it can, so e.g. a cube is not rotated at all
+        available = ["x", "y", "z"]
+        perm = []
+        for axis in ("x", "y", "z"):
+            extent = self.real_dimensions[axis]
+            if axis in available and self.dimensions[axis] == extent:
+                match = axis
+            else:
+                match = next(
+                    candidate
+                    for candidate in available
+                    if self.dimensions[candidate] == extent
+                )  # the dimensions are a permutation of each other, so one is left
+            available.remove(match)
+            perm.append("xyz".index(match))
 
-        old_packages = self.packages.copy()
+        inversions = sum(
+            perm[i] > perm[j] for i in range(3) for j in range(i + 1, 3)
+        )
+        if inversions % 2 == 0:
+            return perm, None
+        return perm, next(axis for axis in range(3) if perm[axis] != axis)
 
-        self.empty()
+    def rotate_ULD(
+        self,
+    ):  # moves every placement from the sorted frame into the real one with a single permutation (and reflection) of the coordinate arrays, then lets gravity take effect: packages settle on the height map from the lowest up
+        dim = self.real_dimensions
+        sdim = [self.dimensions["x"], self.dimensions["y"], self.dimensions["z"]]
+        self.height_map = HeightMap(
+            dim["x"], dim["y"]
+        )  # packages are now placed with respect to the real dimensions
+        self.extreme_points = {(0, 0): None}
 
-        dim = self.real_dimensions.copy()
-        sdim = self.dimensions.copy()
-
-        ### rotate all coordinates wrt rotation of ULD
-
-        if dim == sdim:  # xyz transformation
-            rotate = lambda coords: coords
-            swap = lambda coords: coords
-
-        if (
-            dim["x"] == sdim["y"] and dim["y"] == sdim["x"] and dim["z"] == sdim["z"]
-        ):  # yxz transformation
-            rotate = lambda coords: [sdim["y"] - coords[1], coords[0], coords[2]]
-            swap = lambda coords: [coords[1], coords[0], coords[2]]
-
-        if (
-            dim["x"] == sdim["x"] and dim["y"] == sdim["z"] and dim["z"] == sdim["y"]
-        ):  # xzy transformation
-            rotate = lambda coords: [coords[0], sdim["z"] - coords[2], coords[1]]
-            swap = lambda coords: [coords[0], coords[2], coords[1]]
-
-        if (
-            dim["x"] == sdim["z"] and dim["y"] == sdim["y"] and dim["z"] == sdim["x"]
-        ):  # zyx transformation
-            rotate = lambda coords: [sdim["z"] - coords[2], coords[1], coords[0]]
-            swap = lambda coords: [coords[2], coords[1], coords[0]]
-
-        if (
-            dim["x"] == sdim["z"] and dim["z"] == sdim["y"] and dim["y"] == sdim["x"]
-        ):  # yzx transformation
-            rotate = lambda coords: [coords[2], coords[0], coords[1]]
-            swap = lambda coords: [coords[2], coords[0], coords[1]]
-
-        if (
-            dim["x"] == sdim["y"] and dim["y"] == sdim["z"] and dim["z"] == sdim["x"]
-        ):  # zxy transformation
-            rotate = lambda coords: [coords[1], coords[2], coords[0]]
-            swap = lambda coords: [coords[1], coords[2], coords[0]]
-
-        modify_package = lambda package_details: [
-            package_details[0],
-            rotate(package_details[1]),
-            swap(package_details[2]),
-        ]
-        new_packages = list(map(modify_package, old_packages))
+        old_packages = self.placed_packages
+        if old_packages == []:
+            return
 
-        ### now let gravity take effect
+        perm, reflected = self.real_frame_transform()
+        positions = np.array([package.position for package in old_packages])[:, perm]
+        extents = np.array([package.placed_dimensions for package in old_packages])[
+            :, perm
+        ]
+        if reflected is not None:
+            positions[:, reflected] = sdim[perm[reflected]] - positions[:, reflected]
+        corners = positions - extents / 2
 
-        filter_func = lambda package_details: package_details[1][
-            2
-        ]  # returns z coordinate of COM
-        new_packages.sort(key=filter_func)
-
-        for package_details in new_packages:
-            package = package_details[0]
-            p_x, p_y, p_z = (
-                package_details[2][0],
-                package_details[2][1],
-                package_details[2][2],
+        order = np.argsort(positions[:, 2], kind="stable")  # lowest centre of mass first
+        resting = (
+            perm[2] == 2
+        )  # turning about the vertical axis keeps every package resting where it is, so there is nothing to settle
+        self.placed_packages = []
+        for idx in order.tolist():
+            package = old_packages[idx]
+            x, y = float(corners[idx, 0]), float(corners[idx, 1])
+            p_x, p_y, p_z = extents[idx].tolist()
+            if resting:
+                z = float(corners[idx, 2])
+            else:
+                z = self.height_map.max_height(x, y, p_x, p_y)
+            package.table.record_placement(
+                package.index,
+                self,
+                (x + p_x / 2, y + p_y / 2, z + p_z / 2),
+                (p_x, p_y, p_z),
             )
-            com_x, com_y = package_details[1][0], package_details[1][1]
-            x, y = com_x - p_x / 2, com_y - p_y / 2
-            self.drop_package(package, x, y, p_x, p_y, p_z, True)
+            self.placed_packages.append(package)
+            self.height_map.add(x, y, p_x, p_y, z + p_z)
+            self.add_extreme_points(x, y, p_x, p_y)
 
-        self.sorted_dimensions = (
-            None  # voiding this characteristic as it should not be used again
-        )
+    def use_real_frame(
+        self,
+    ):  # packs in the real orientation from now on, so placements given in real coordinates can be dropped back in as they are. rotate_ULD then has nothing to rotate. Only call it while the ULD is empty
+        self.dimensions = self.real_dimensions.copy()
+        self.height_map = HeightMap(self.dimensions["x"], self.dimensions["y"])
+        self.extreme_points = {(0, 0): None}
+        self.vertical_axis = 2
+
+    def set_stability(
+        self, stability
+    ):  # checks every drop against the load rules of stability (a Stability, or None for none). The ULD packs in its real frame from then on, so the rules see the real vertical axis and rotate_ULD moves nothing. Only call it while the ULD is empty
+        self.use_real_frame()
+        self.stability = stability
 
     def empty(self):  # removes all packages from ULD
-        for lst in self.packages:
-            package = lst[0]
+        for package in self.placed_packages:
             package.placed = False
-        self.packages.clear()
+        self.placed_packages.clear()
+        self.height_map.clear()
+        self.extreme_points = {(0, 0): None}
+        if self.stability is not None:
+            self.stability.clear()
         self.remaining_weight_limit = self.weight_limit
         self.remaining_volume = self.volume
 
+    def balance(
+        self,
+    ):  # takes economy packages that nothing rests on out of the ULD, the one that helps most first, until its centre of gravity is inside the envelope of its load rules or no removal brings it closer. Returns the packages taken out
+        # priority packages always stay, so a ULD they pull out of the envelope on their own is left as close to it as the economy packages allow
+        stability = self.stability
+        removed = []
+        if stability is None or stability.cog_envelope is None:
+            return removed
+
+        while stability.excess() > 0:
+            supporting = stability.supporting()
+            candidates = [
+                (stability.excess(without=package), package.weight, idx)
+                for idx, package in enumerate(self.placed_packages)
+                if not (package.is_priority) and package not in supporting
+            ]
+            if candidates == [] or not (min(candidates)[0] < stability.excess()):
+                break
+            removed += self.remove_packages(
+                {self.placed_packages[min(candidates)[2]]}
+            )
+        return removed
+
+    def remove_packages(
+        self, packages
+    ):  # takes packages (a set) out by dropping the others back in where they were, in the same order. Returns packages plus any of the others the drop turned down
+        drops = [
+            (package, (box[0], box[1], *package.placed_dimensions))
+            for package, box in zip(self.placed_packages, self.height_map.boxes)
+            if package not in packages
+        ]  # height map boxes are in drop order and hold the exact corner the package was dropped at
+        self.empty()
+        return list(packages) + [
+            package for package, drop in drops if not (self.drop_package(package, *drop))
+        ]
+
     def toJson(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return json.dumps(
+            {
+                "name": self.name,
+                "real_dimensions": self.real_dimensions,
+                "dimensions": self.dimensions,
+                "weight_limit": self.weight_limit,
+                "volume": self.volume,
+                "pseudo_density": self.pseudo_density,
+                "packages": self.packages,
+                "remaining_weight_limit": self.remaining_weight_limit,
+                "remaining_volume": self.remaining_volume,
+                "priority": self.priority,
+            },
+            default=lambda o: o.name,  # packages are referred to by name
+        )
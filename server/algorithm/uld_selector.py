@@ -0,0 +1,81 @@
+import numpy as np
+from .density_index import DensityIndex
+
+
+def uld_capacity(
+    uld, density
+):  # heuristic value of a uld. Takes density into account as well as how spacious it is. A uld matching the density exactly is the best possible fit
+    if density == uld.pseudo_density:
+        return float("inf")
+    return (uld.volume) * (uld.weight_limit) / (density - uld.pseudo_density)
+
+
+def package_totals(packages):  # total weight and volume of a list or DensityIndex of packages
+    if isinstance(packages, DensityIndex):
+        return packages.total_weight, packages.total_volume
+    total_weight = total_volume = 0
+    for package in packages:
+        total_weight += package.weight
+        total_volume += package.volume
+    return total_weight, total_volume
+
+
+class UldSelector(object):
+
+    def __init__(
+        self, ulds, heuristic="capacity"
+    ):  # picks the best remaining uld for the remaining packages, by default with the same rule as select_uld (ties go to the earliest uld)
+        # the density of the remaining packages changes after nearly every fill, so a kept ranking would be rebuilt almost every time. Instead every remaining uld is scored in one pass over arrays of their sizes
+        self.ulds = list(ulds)
+        self.heuristic = heuristic
+        self.order = {uld: idx for idx, uld in enumerate(self.ulds)}
+        self.alive = np.ones(len(self.ulds), dtype=bool)
+        self.volumes = np.array([uld.volume for uld in self.ulds], dtype=float)
+        self.weight_limits = np.array(
+            [uld.weight_limit for uld in self.ulds], dtype=float
+        )
+        self.pseudo_densities = np.array(
+            [uld.pseudo_density for uld in self.ulds], dtype=float
+        )
+        self.spaces = (
+            self.volumes * self.weight_limits
+        )  # the numerator of uld_capacity
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def remove(self, uld):
+        self.alive[self.order[uld]] = False
+
+    def first_remaining(self):
+        if not (self.alive.any()):
+            return None
+        return self.ulds[int(np.argmax(self.alive))]
+
+    def scores(
+        self, density
+    ):  # how much every uld is preferred: uld_capacity under "capacity", while "volume" and "weight_limit" simply prefer the biggest ulds. -inf for the removed ones
+        if self.heuristic == "volume":
+            scores = self.volumes.copy()
+        elif self.heuristic == "weight_limit":
+            scores = self.weight_limits.copy()
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = self.spaces / (density - self.pseudo_densities)
+            scores[self.pseudo_densities == density] = np.inf
+        scores[~self.alive] = -np.inf
+        return scores
+
+    def select(self, packages):  # packages is a list or a DensityIndex of the packages still to be placed
+        if len(self) == 0:
+            return None
+
+        total_weight, total_volume = package_totals(packages)
+        if len(packages) == 0 or total_volume <= 0:
+            return self.first_remaining()
+
+        scores = self.scores(total_weight / total_volume)
+        best = int(np.argmax(scores))  # the first of equal scores
+        if not (scores[best] > 0):
+            return self.first_remaining()  # no uld has a positive capacity
+        return self.ulds[best]
@@ -0,0 +1,239 @@
+import time
+import random
+import tracemalloc
+from contextlib import contextmanager
+
+import algorithm
+from algorithm import PackageTable, ULD, solve, metrics
+
+ULD_TYPES = [
+    (224, 318, 162, 2500),
+    (224, 318, 162, 2500),
+    (244, 318, 244, 2800),
+    (244, 318, 285, 3500),
+    (153, 156, 162, 1500),
+    (300, 244, 162, 3000),
+]  # length, width, height, max weight
+
+TIMED_FUNCTIONS = [
+    "stack_priority_packages",
+    "transition_stacking",
+    "stack_economy_packages",
+    "allocate_packages",
+    "three_dimensional_iterative_stacking",
+    "brute_pack",
+    "finish_packing",
+    "compile_data",
+]  # module level functions of algorithm whose wall time is reported. ULD.rotate_ULD is timed as well
+
+
+def generate_manifest(
+    package_count, seed=0, priority_fraction=0.2, fill_ratio=1.3
+):  # returns (uld_csv, package_csv) in the format the client's csvToJson.js reads. There are enough ulds for the packages to fill them fill_ratio times over
+    rng = random.Random(seed)
+
+    package_rows = []
+    total_volume = 0
+    for idx in range(package_count):
+        length, width, height = (rng.randint(40, 120) for _ in range(3))
+        weight = rng.randint(10, 100)
+        total_volume += length * width * height
+        if rng.random() < priority_fraction:
+            package_rows.append(
+                f"P-{idx + 1},{length},{width},{height},{weight},Priority,-"
+            )
+        else:
+            delay_cost = rng.randint(50, 150)
+            package_rows.append(
+                f"P-{idx + 1},{length},{width},{height},{weight},Economy,{delay_cost}"
+            )
+
+    uld_rows = []
+    uld_volume = 0
+    while uld_volume * fill_ratio < total_volume or len(uld_rows) < 2:
+        length, width, height, max_weight = rng.choice(ULD_TYPES)
+        uld_volume += length * width * height
+        uld_rows.append(f"U{len(uld_rows) + 1},{length},{width},{height},{max_weight}")
+
+    return "\n".join(uld_rows) + "\n", "\n".join(package_rows) + "\n"
+
+
+def parse_ulds(csv):  # same as getULDs in the client's csvToJson.js
+    ulds = []
+    for row in csv.splitlines():
+        if row == "":
+            continue
+        uld_data = row.split(",")
+        if len(uld_data) != 5:
+            raise Exception("Something is wrong in CSV data of ULDs, please check.")
+        ulds.append(
+            {
+                "name": uld_data[0],
+                "length": float(uld_data[1]),
+                "width": float(uld_data[2]),
+                "height": float(uld_data[3]),
+                "maxWeight": float(uld_data[4]),
+            }
+        )
+    return ulds
+
+
+def parse_float(value):  # parseFloat of a non number is NaN, which the client sends as null
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_packages(csv):  # same as getPackages in the client's csvToJson.js
+    packages = []
+    for row in csv.splitlines():
+        if row == "":
+            continue
+        package_data = row.split(",")
+        if len(package_data) != 7:
+            raise Exception(
+                "Something is wrong in CSV data of Packages, please check."
+            )
+        packages.append(
+            {
+                "name": package_data[0],
+                "length": float(package_data[1]),
+                "width": float(package_data[2]),
+                "height": float(package_data[3]),
+                "weight": float(package_data[4]),
+                "isPriority": package_data[5].lower() == "priority",
+                "delayCost": parse_float(package_data[6]),
+            }
+        )
+    return packages
+
+
+@contextmanager
+def stage_timers(timings):  # wraps the timed functions so their total wall time (outermost calls only) adds up in timings
+    originals = {name: getattr(algorithm, name) for name in TIMED_FUNCTIONS}
+    original_rotate = ULD.rotate_ULD
+    depth = {}
+
+    def wrap(name, function):
+        def timed(*args, **kwargs):
+            depth[name] = depth.get(name, 0) + 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                depth[name] -= 1
+                if depth[name] == 0:
+                    timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+        return timed
+
+    for name, function in originals.items():
+        setattr(algorithm, name, wrap(name, function))
+    ULD.rotate_ULD = wrap("rotate_ULD", original_rotate)
+    try:
+        yield timings
+    finally:
+        for name, function in originals.items():
+            setattr(algorithm, name, function)
+        ULD.rotate_ULD = original_rotate
+
+
+def build_manifest(uld_csv, package_csv):  # turns the csv files into solver inputs, the way /get-coords does
+    package_list = PackageTable.from_json(parse_packages(package_csv)).packages()
+    uld_list = [
+        ULD(
+            name=uld["name"],
+            dimensions=(uld["length"], uld["width"], uld["height"]),
+            weight_limit=uld["maxWeight"],
+        )
+        for uld in parse_ulds(uld_csv)
+    ]
+    return package_list, uld_list
+
+
+def run_benchmark(
+    package_count, seed=0, priority_uld_cost=5000, config=None, measure_memory=True
+):  # solves one synthetic manifest headlessly and returns its measurements. Memory is measured in a second run, since tracing slows the solver down
+    uld_csv, package_csv = generate_manifest(package_count, seed)
+
+    package_list, uld_list = build_manifest(uld_csv, package_csv)
+    timings = {}
+    metrics.reset()
+    with stage_timers(timings):
+        start = time.perf_counter()
+        output_data = solve(package_list, uld_list, priority_uld_cost, config)
+        total_time = time.perf_counter() - start
+    counters = metrics.snapshot()
+
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        package_list_copy, uld_list_copy = build_manifest(uld_csv, package_csv)
+        solve(package_list_copy, uld_list_copy, priority_uld_cost, config)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    packed_volume = sum(package.volume for package in package_list if package.placed)
+    uld_volume = sum(uld.volume for uld in uld_list)
+
+    return {
+        "packages": package_count,
+        "ulds": len(uld_list),
+        "seed": seed,
+        "wall_time": total_time,
+        "stage_times": timings,
+        "counters": {**counters["counters"], **counters["gauges"]},
+        "peak_memory": peak_memory,
+        "packages_placed": output_data["packages_placed"],
+        "volume_utilization": packed_volume / uld_volume,
+        "total_cost": output_data["total_cost"],
+        "gap": output_data["gap"],
+    }
+
+
+def compare_to_baseline(
+    results, baseline, time_tolerance=0.25
+):  # returns a list of regressions (as strings) of results against a saved baseline of the same scales
+    regressions = []
+    baseline_by_scale = {
+        (entry["packages"], entry["seed"]): entry for entry in baseline["results"]
+    }
+    for result in results:
+        entry = baseline_by_scale.get((result["packages"], result["seed"]))
+        if entry is None:
+            continue
+        scale = f"{result['packages']} packages"
+        if result["wall_time"] > entry["wall_time"] * (1 + time_tolerance):
+            regressions.append(
+                f"{scale}: wall time {result['wall_time']:.3f}s vs {entry['wall_time']:.3f}s"
+            )
+        if result["total_cost"] > entry["total_cost"]:
+            regressions.append(
+                f"{scale}: total cost {result['total_cost']} vs {entry['total_cost']}"
+            )
+        if result["packages_placed"] < entry["packages_placed"]:
+            regressions.append(
+                f"{scale}: packages placed {result['packages_placed']} vs {entry['packages_placed']}"
+            )
+    return regressions
+
+
+def baseline_deltas(
+    results, baseline
+):  # one line per result with a baseline entry of the same scale: total cost and wall time relative to it
+    deltas = []
+    baseline_by_scale = {
+        (entry["packages"], entry["seed"]): entry for entry in baseline["results"]
+    }
+    for result in results:
+        entry = baseline_by_scale.get((result["packages"], result["seed"]))
+        if entry is None:
+            continue
+        cost_change = (result["total_cost"] - entry["total_cost"]) / entry["total_cost"]
+        time_change = (result["wall_time"] - entry["wall_time"]) / entry["wall_time"]
+        deltas.append(
+            f"{result['packages']} packages vs baseline: cost {result['total_cost']} vs {entry['total_cost']} ({cost_change:+.1%}), "
+            f"wall time {result['wall_time']:.3f}s vs {entry['wall_time']:.3f}s ({time_change:+.1%})"
+        )
+    return deltas
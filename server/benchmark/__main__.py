@@ -0,0 +1,107 @@
+import sys
+import json
+import argparse
+import contextlib
+import io
+
+from algorithm import PackingConfig
+from algorithm.config import ECONOMY_SELECTION_MODES, PLACEMENT_ENGINES
+from benchmark import (
+    run_benchmark,
+    compare_to_baseline,
+    baseline_deltas,
+    generate_manifest,
+)
+
+# usage (from the server directory): python -m benchmark --scales 100 1000 --compare benchmark/baseline.json
+# benchmark/baseline.json holds the 100 and 1000 package runs of the current pipeline; re-save it with --save-baseline after intended changes
+# benchmark/original.json holds the same runs of the pipeline as it was before brute_pack was vectorized, when it placed at most one leftover per call. Compare to it to see what the solver changes since then did to cost and placements
+# --compare also prints cost and time against the baseline, e.g. to weigh --economy-selection value against the default density matching
+
+parser = argparse.ArgumentParser(
+    description="Times the packing pipeline on synthetic manifests."
+)
+parser.add_argument("--scales", type=int, nargs="+", default=[100, 1000, 10000])
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--priority-uld-cost", type=float, default=5000)
+parser.add_argument("--precision", type=int, default=10)
+parser.add_argument("--adaptive", action="store_true")
+parser.add_argument("--time-budget", type=float, default=None)
+parser.add_argument("--placement", choices=PLACEMENT_ENGINES, default="stacking")
+parser.add_argument("--gap-tolerance", type=float, default=None)
+parser.add_argument("--economy-workers", type=int, default=1)
+parser.add_argument("--min-support", type=float, default=None)
+parser.add_argument("--max-load", type=float, default=None)
+parser.add_argument("--cog-envelope", type=float, default=None)
+parser.add_argument(
+    "--economy-selection", choices=ECONOMY_SELECTION_MODES, default="density"
+)
+parser.add_argument("--no-memory", action="store_true", help="skip the traced run")
+parser.add_argument("--save-baseline", help="write the results to this file")
+parser.add_argument("--compare", help="baseline file to check for regressions")
+parser.add_argument("--time-tolerance", type=float, default=0.25)
+parser.add_argument(
+    "--manifest-dir", help="also write each generated manifest as csv files here"
+)
+args = parser.parse_args()
+
+config = PackingConfig(
+    precision=args.precision,
+    adaptive=args.adaptive,
+    time_budget=args.time_budget,
+    gap_tolerance=args.gap_tolerance,
+    economy_selection=args.economy_selection,
+    placement=args.placement,
+    economy_workers=args.economy_workers,
+    min_support=args.min_support,
+    max_load=args.max_load,
+    cog_envelope=args.cog_envelope,
+)
+
+results = []
+for scale in args.scales:
+    if args.manifest_dir:
+        uld_csv, package_csv = generate_manifest(scale, args.seed)
+        with open(f"{args.manifest_dir}/ulds_{scale}.csv", "w") as f:
+            f.write(uld_csv)
+        with open(f"{args.manifest_dir}/packages_{scale}.csv", "w") as f:
+            f.write(package_csv)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the solver logs to stdout
+        result = run_benchmark(
+            scale,
+            args.seed,
+            args.priority_uld_cost,
+            config,
+            measure_memory=not args.no_memory,
+        )
+    results.append(result)
+
+    memory = (
+        "-"
+        if result["peak_memory"] is None
+        else f"{result['peak_memory'] / 2**20:.1f} MiB"
+    )
+    print(
+        f"{scale} packages / {result['ulds']} ulds: {result['wall_time']:.3f}s, peak {memory}, "
+        f"placed {result['packages_placed']}, utilization {result['volume_utilization']:.1%}, cost {result['total_cost']} (gap {result['gap']:.1%})"
+    )
+    for stage, seconds in result["stage_times"].items():
+        print(f"    {stage}: {seconds:.3f}s")
+    for counter, value in result["counters"].items():
+        print(f"    {counter}: {value}")
+
+if args.save_baseline:
+    with open(args.save_baseline, "w") as f:
+        json.dump({"results": results}, f, indent=2)
+
+if args.compare:
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    for delta in baseline_deltas(results, baseline):
+        print(delta)
+    regressions = compare_to_baseline(results, baseline, args.time_tolerance)
+    for regression in regressions:
+        print("REGRESSION:", regression)
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from algorithm import PackingConfig
+
+PACKAGE_FIELDS = (
+    "name",
+    "length",
+    "width",
+    "height",
+    "weight",
+    "isPriority",
+    "delayCost",
+    "thisSideUp",
+)
+ULD_FIELDS = ("name", "length", "width", "height", "maxWeight")
+PLAN_ID = re.compile(r"[0-9a-f]{64}")  # what the fingerprints below produce
+
+
+def canonical_number(value):  # 10, 10.0 and "10" all fingerprint the same
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def manifest_fingerprint(
+    data,
+):  # content hash of a /get-coords request body: packages and ulds (only the fields the solver reads, in order), priority_uld_cost and solver settings
+    config = vars(PackingConfig.from_json(data)).copy()
+    config.pop("workers")  # does not change the plan
+    canonical = {
+        "packages": [
+            [
+                (
+                    canonical_number(package.get(field))
+                    if field not in ("name", "isPriority", "thisSideUp")
+                    else package.get(field)
+                )
+                for field in PACKAGE_FIELDS
+            ]
+            for package in data["packages"]
+        ],
+        "ulds": [
+            [
+                uld.get(field) if field == "name" else canonical_number(uld.get(field))
+                for field in ULD_FIELDS
+            ]
+            for uld in data["ulds"]
+        ],
+        "priority_uld_cost": canonical_number(data["priority_uld_cost"]),
+        "config": config,
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def replan_fingerprint(
+    data, plan
+):  # a re-plan depends on the previous plan as well as on the new manifest
+    encoded = manifest_fingerprint(data) + json.dumps(
+        plan, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def hashed_lines(
+    stream, digest
+):  # decodes the lines of a binary stream one at a time, feeding their bytes to digest on the way
+    for line in stream:
+        digest.update(line)
+        yield line.decode("utf-8")
+
+
+def upload_fingerprint(
+    package_digest, uld_digest, settings
+):  # content hash of a /get-coords/upload request, from the digests of its files and its settings
+    config = vars(PackingConfig.from_json(settings)).copy()
+    config.pop("workers")
+    canonical = {
+        "packages": package_digest.hexdigest(),
+        "ulds": uld_digest.hexdigest(),
+        "priority_uld_cost": canonical_number(settings["priority_uld_cost"]),
+        "config": config,
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ResultCache(object):
+
+    def __init__(
+        self, max_entries=64, directory=None
+    ):  # LRU cache of output data by fingerprint. If directory is given, plans are also written there and survive restarts and evictions
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):  # keys come from clients, so anything but a fingerprint is refused before it gets near the filesystem
+        if not (self.valid_key(key)):
+            raise Exception("INVALID PLAN ID")
+        return os.path.join(self.directory, f"{key}.json")
+
+    @staticmethod
+    def valid_key(key):
+        return isinstance(key, str) and PLAN_ID.fullmatch(key) is not None
+
+    def get(self, key):  # returns None on a miss, and for keys that cannot be fingerprints
+        if not (self.valid_key(key)):
+            return None
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        if self.directory is None or not os.path.exists(self.path(key)):
+            return None
+        with open(self.path(key)) as f:
+            output_data = json.load(f)
+        self.put(key, output_data, write_through=False)  # promote to memory
+        return output_data
+
+    def put(self, key, output_data, write_through=True):
+        if not (self.valid_key(key)):
+            raise Exception("INVALID PLAN ID")
+        with self.lock:
+            self.entries[key] = output_data
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+        if write_through and self.directory is not None:
+            temporary_path = self.path(key) + ".tmp"
+            with open(temporary_path, "w") as f:
+                json.dump(output_data, f)
+            os.replace(temporary_path, self.path(key))  # readers never see half a file
+
+
+results = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_SIZE", 64)),
+    directory=os.environ.get("RESULT_CACHE_DIR"),
+)
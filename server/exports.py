@@ -0,0 +1,148 @@
+import os
+import io
+import time
+import uuid
+import struct
+import tempfile
+import threading
+
+BUFFER_SIZE = 64 * 1024  # bytes gathered before a chunk is handed on
+BINARY_MAGIC = b"ULDP"
+BINARY_VERSION = 1
+
+
+def csv_chunks(
+    output_data,
+):  # yields the plan as text, BUFFER_SIZE bytes at a time: a "total_cost,packages_placed,priority_uld_count" line, then "name,uld,x1,y1,z1,x2,y2,z2" per package ("NONE" and -1s if it was not placed)
+    buffer = io.StringIO()
+    buffer.write(
+        f"{output_data['total_cost']},{output_data['packages_placed']},{output_data['priority_uld_count']}\n"
+    )
+
+    for package in output_data["packages"]:
+        if package["uld"] is None:
+            buffer.write(f"{package['name']},NONE,-1,-1,-1,-1,-1,-1\n")
+        else:
+            buffer.write(package["name"])
+            buffer.write(",")
+            buffer.write(package["uld"])
+            for value in (
+                package["reference_corner"] + package["diagonally_opposite_corner"]
+            ):
+                buffer.write(",")
+                buffer.write(str(value))
+            buffer.write("\n")
+
+        if buffer.tell() >= BUFFER_SIZE:
+            yield buffer.getvalue().encode()
+            buffer = io.StringIO()
+
+    yield buffer.getvalue().encode()
+
+
+def binary_chunks(
+    output_data,
+):  # yields the plan in a compact little endian format, BUFFER_SIZE bytes at a time
+    # header: b"ULDP", version (u8), total_cost (f64), packages_placed (u32), priority_uld_count (u32), uld count (u16) and the uld names
+    # then per package: name, uld (i32 index into the uld names, -1 if not placed), is_priority (u8) and both corners (6 x f32)
+    # names are utf-8 with a u16 byte length in front
+    def name(text):
+        encoded = text.encode()
+        return struct.pack("<H", len(encoded)) + encoded
+
+    uld_names = []
+    uld_indices = {}
+    for package in output_data["packages"]:
+        if package["uld"] is not None and package["uld"] not in uld_indices:
+            uld_indices[package["uld"]] = len(uld_names)
+            uld_names.append(package["uld"])
+
+    buffer = bytearray(BINARY_MAGIC)
+    buffer += struct.pack(
+        "<BdIIH",
+        BINARY_VERSION,
+        output_data["total_cost"],
+        output_data["packages_placed"],
+        output_data["priority_uld_count"],
+        len(uld_names),
+    )
+    for uld_name in uld_names:
+        buffer += name(uld_name)
+
+    record = struct.Struct("<iB6f")
+    for package in output_data["packages"]:
+        buffer += name(package["name"])
+        if package["uld"] is None:
+            buffer += record.pack(-1, package["is_priority"], *([-1.0] * 6))
+        else:
+            buffer += record.pack(
+                uld_indices[package["uld"]],
+                package["is_priority"],
+                *package["reference_corner"],
+                *package["diagonally_opposite_corner"],
+            )
+
+        if len(buffer) >= BUFFER_SIZE:
+            yield bytes(buffer)
+            buffer = bytearray()
+
+    yield bytes(buffer)
+
+
+FORMATS = {
+    "csv": (csv_chunks, ".txt", "text/plain"),
+    "binary": (binary_chunks, ".bin", "application/octet-stream"),
+}  # name -> (writer, file extension, mimetype)
+
+
+class ExportStore(object):
+
+    def __init__(
+        self, directory=None, max_age=3600
+    ):  # keeps exported plans as files in directory (a temporary one unless given) and deletes them max_age seconds after they were written
+        if directory is None:
+            directory = os.path.join(tempfile.gettempdir(), "uld-exports")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+    def write(self, output_data, file_format="csv"):  # returns the name of the new file
+        if file_format not in FORMATS:
+            raise Exception(f"UNKNOWN FORMAT {file_format!r}")
+        self.expire()
+
+        writer, extension, _ = FORMATS[file_format]
+        filename = uuid.uuid4().hex + extension
+        temporary_path = self.path(filename) + ".tmp"
+        with open(temporary_path, "wb", buffering=BUFFER_SIZE) as f:
+            for chunk in writer(output_data):
+                f.write(chunk)
+        os.replace(temporary_path, self.path(filename))
+        return filename
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def find(self, filename):  # path of an export that is still there, else None. Anything but a bare file name is refused
+        if os.path.basename(filename) != filename or filename.endswith(".tmp"):
+            return None
+        self.expire()
+        path = self.path(filename)
+        return path if os.path.isfile(path) else None
+
+    def expire(self):  # deletes exports older than max_age
+        cutoff = time.time() - self.max_age
+        with self.lock:
+            for entry in os.scandir(self.directory):
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass  # another worker got there first
+
+
+exports = ExportStore(
+    directory=os.environ.get("EXPORT_DIR"),
+    max_age=float(os.environ.get("EXPORT_MAX_AGE", 3600)),
+)
@@ -0,0 +1,185 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from algorithm import PackingConfig, Progress, manifest_from_json, metrics
+from algorithm.portfolio import solve_portfolio
+from cache import results
+
+
+def run_job(
+    manifest, progress_state
+):  # runs in a worker process. manifest is a /get-coords request body, progress_state a shared dict the web server reads progress from. The solve starts at most MAX_WORKERS processes of its own, as portfolio or economy workers but never both
+    # returns the output data in "data" and the metrics snapshot of the solve in "metrics"
+    metrics.reset()
+    package_list, uld_list, priority_uld_cost = manifest_from_json(manifest)
+    config = PackingConfig.from_json(manifest)
+    progress = Progress(callback=progress_state.update)
+    progress.update(stage="started")
+    output_data = solve_portfolio(
+        package_list, uld_list, priority_uld_cost, config, progress
+    )
+    progress.update(stage="done")
+    return {"data": output_data, "metrics": metrics.snapshot()}
+
+
+def run_flight(
+    manifest,
+):  # runs in a worker process and solves one manifest of a batch. Failures are returned rather than raised, so one bad flight does not fail the batch. The metrics snapshot of the solve comes back in "metrics"
+    start = time.perf_counter()
+    metrics.reset()
+    try:
+        package_list, uld_list, priority_uld_cost = manifest_from_json(manifest)
+        config = PackingConfig.from_json(manifest).copy(
+            workers=1, economy_workers=1
+        )  # the batch already keeps every worker busy
+        output_data = solve_portfolio(package_list, uld_list, priority_uld_cost, config)
+        result = {"success": True, "data": output_data}
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    result["elapsed"] = time.perf_counter() - start
+    result["metrics"] = metrics.snapshot()
+    return result
+
+
+def failed_flight(
+    error, start
+):  # the run_flight result of a flight that never got to run_flight's own error handling, e.g. because its worker process died
+    return {
+        "success": False,
+        "error": str(error) or type(error).__name__,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+class JobManager(object):
+
+    def __init__(
+        self, workers=None, max_finished_jobs=100
+    ):  # solves submitted manifests on a local process pool. Only the last max_finished_jobs finished jobs are kept
+        self.workers = workers or int(os.environ.get("JOB_WORKERS", 0)) or os.cpu_count()
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}  # job id -> {"future", "progress", "plan_id", "submitted", "finished"}
+        self.lock = threading.Lock()
+        self.executor = None  # created on first use, so importing this module is cheap
+        self.manager = None
+
+    def start(self):
+        if self.executor is None:
+            self.manager = multiprocessing.Manager()
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(
+        self, manifest, plan_id=None
+    ):  # queues a manifest and returns its job id right away. The output data of a successful job is stored in results under plan_id (if given), like /get-coords stores its own
+        with self.lock:
+            self.start()
+            job_id = uuid.uuid4().hex
+            progress_state = self.manager.dict(Progress().to_json())
+            future = self.executor.submit(run_job, manifest, progress_state)
+            job = {
+                "future": future,
+                "progress": progress_state,
+                "plan_id": plan_id,
+                "submitted": time.time(),
+                "finished": None,
+            }
+            future.add_done_callback(lambda _: self.finish(job))
+            self.jobs[job_id] = job
+            self.evict()
+        return job_id
+
+    def finish(self, job):  # called once the future of job is done
+        future = job["future"]
+        if not future.cancelled() and future.exception() is None:
+            metrics.merge(future.result()["metrics"])
+            if job["plan_id"] is not None:
+                results.put(job["plan_id"], future.result()["data"])
+        job["finished"] = time.time()
+
+    def evict(self):  # forgets the oldest finished jobs beyond max_finished_jobs. Called with the lock held
+        finished = sorted(
+            (job["finished"], job_id)
+            for job_id, job in self.jobs.items()
+            if job["finished"] is not None
+        )
+        for _, job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def solve_batch(
+        self, manifests
+    ):  # solves independent manifests on the pool and returns their run_flight results in order. Blocks until all are done
+        # a flight whose worker died (or that could not be handed to one) comes back failed like any other, the rest still return
+        if manifests == []:
+            return []
+        with self.lock:
+            self.start()
+            executor = self.executor
+
+        start = time.perf_counter()
+        results = [None] * len(manifests)
+        futures = {}
+        broken = False
+        for idx, manifest in enumerate(manifests):
+            try:
+                futures[executor.submit(run_flight, manifest)] = idx
+            except BrokenProcessPool as e:
+                broken = True
+                results[idx] = failed_flight(e, start)
+
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                broken = broken or isinstance(e, BrokenProcessPool)
+                results[futures[future]] = failed_flight(e, start)
+
+        for result in results:
+            if "metrics" in result:  # not there for flights whose worker died
+                metrics.merge(result.pop("metrics"))
+        if broken:
+            self.restart(executor)
+        return results
+
+    def restart(
+        self, executor
+    ):  # replaces a broken pool, so later jobs and batches get working processes. Jobs still queued on it have already failed
+        with self.lock:
+            if self.executor is executor:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        executor.shutdown(wait=False)
+
+    def status(self, job_id):  # returns None for unknown jobs
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+
+        future = job["future"]
+        if job["finished"] is not None:  # set once the result is stored, not as soon as the future is done
+            state = "failed" if future.exception() is not None else "done"
+        elif future.running():
+            state = "running"
+        else:
+            state = "queued"
+
+        status = {
+            "job_id": job_id,
+            "status": state,
+            "progress": dict(job["progress"]),
+            "elapsed": (job["finished"] or time.time()) - job["submitted"],
+        }
+        if state == "failed":
+            status["error"] = str(future.exception())
+        elif state == "done" and job["plan_id"] is not None:
+            status["plan_id"] = job["plan_id"]
+        return status
+
+    def result(self, job_id):  # output data of a finished job. Raises if the job failed
+        return self.jobs[job_id]["future"].result()["data"]
+
+
+jobs = JobManager()
@@ -1,17 +1,27 @@
-from flask import Flask, request, jsonify, send_file
+import json
+import hashlib
+import time
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS, cross_origin
 
 from algorithm import (
-    Package,
-    ULD,
-    confirm_validity,
-    get_data,
-    return_data,
-    stack_economy_packages,
-    stack_priority_packages,
-    transition_stacking,
+    PackingConfig,
+    manifest_from_json,
     log,
-    save_file_and_get_name,
+    metrics,
+    profiled,
+)
+from algorithm.portfolio import solve_portfolio
+from jobs import jobs
+from exports import exports, FORMATS as EXPORT_FORMATS
+from algorithm.replan import replan
+from algorithm.ingest import manifest_from_files
+from cache import (
+    results,
+    manifest_fingerprint,
+    replan_fingerprint,
+    hashed_lines,
+    upload_fingerprint,
 )
 
 app = Flask(__name__)
@@ -22,70 +32,304 @@ app.config["CORS_HEADERS"] = "Content-Type"
 @app.route("/get-coords", methods=["POST"])
 @cross_origin()
 def get_coords():
-    priority_uld_cost = request.json["priority_uld_cost"]
-    packages = request.json["packages"]
-    ulds = request.json["ulds"]
-
-    package_list = []
-    for package in packages:
-        pkg = Package(
-            name=package["name"],
-            dimensions=(package["length"], package["width"], package["height"]),
-            weight=package["weight"],
-            delay_cost=package["delayCost"],
-            is_priority=package["isPriority"],
+    try:
+        config = PackingConfig.from_json(request.json)
+        plan_id = manifest_fingerprint(request.json)
+        profile_requested = request.json.get("profile", False)
+
+        cached_output_data = results.get(plan_id)
+        if cached_output_data is not None and not profile_requested:
+            metrics.count("result_cache_hits")
+            return jsonify(
+                {"success": True, "data": cached_output_data, "plan_id": plan_id}
+            )
+        metrics.count("result_cache_misses")
+    except Exception as e:
+        log("ERROR", str(e), "ERROR")
+        return jsonify({"success": False, "error": str(e)})
+
+    package_list, uld_list, priority_uld_cost = manifest_from_json(request.json)
+
+    try:
+        with metrics.timer("get_coords"), profiled(profile_requested) as profile:
+            output_data = solve_portfolio(
+                package_list, uld_list, priority_uld_cost, config
+            )  # a single pipeline run unless the request asks for more strategies
+
+        log("Algorithm output", output_data, "DEBUG")
+        results.put(plan_id, output_data)
+
+        return jsonify(
+            {"success": True, "data": output_data, "plan_id": plan_id, **profile}
         )
-        package_list.append(pkg)
+    except Exception as e:
+        log("ERROR", str(e), "ERROR")
+        return jsonify({"success": False, "error": str(e)})
 
-    uld_list = []
-    for uld in ulds:
 
-        uld_list.append(
-            ULD(
-                name=uld["name"],
-                dimensions=(uld["length"], uld["width"], uld["height"]),
-                weight_limit=uld["maxWeight"],
+@app.route("/get-coords/upload", methods=["POST"])
+@cross_origin()
+def get_coords_upload():  # multipart form with the raw "packages" and "ulds" files (CSV as the client reads them, or NDJSON) and a "settings" field holding the rest of a /get-coords body as JSON
+    try:
+        settings = json.loads(request.form.get("settings", "{}"))
+        config = PackingConfig.from_json(settings)
+        package_file, uld_file = request.files["packages"], request.files["ulds"]
+        file_format = settings.get("format")
+        if file_format is None:
+            file_format = (
+                "ndjson"
+                if package_file.filename.endswith((".ndjson", ".jsonl"))
+                else "csv"
             )
-        )
 
+        package_digest, uld_digest = hashlib.sha256(), hashlib.sha256()
+        with metrics.timer("ingest"):
+            package_list, uld_list, priority_uld_cost = manifest_from_files(
+                hashed_lines(package_file.stream, package_digest),
+                hashed_lines(uld_file.stream, uld_digest),
+                settings["priority_uld_cost"],
+                file_format,
+            )
+        plan_id = upload_fingerprint(package_digest, uld_digest, settings)
+
+        cached_output_data = results.get(plan_id)
+        if cached_output_data is not None:
+            metrics.count("result_cache_hits")
+            return jsonify(
+                {"success": True, "data": cached_output_data, "plan_id": plan_id}
+            )
+        metrics.count("result_cache_misses")
+
+        with metrics.timer("get_coords"):
+            output_data = solve_portfolio(
+                package_list, uld_list, priority_uld_cost, config
+            )
+        results.put(plan_id, output_data)
+
+        return jsonify({"success": True, "data": output_data, "plan_id": plan_id})
+    except Exception as e:
+        log("ERROR", str(e), "ERROR")
+        return jsonify({"success": False, "error": str(e)})
+
+
+@app.route("/replan", methods=["POST"])
+@cross_origin()
+def replan_coords():  # body: the previous /get-coords body, its result as "plan" (output data) or "plan_id", and the delta as "added_packages", "removed_packages" and "removed_ulds" (names)
     try:
-        ulds, priority_packages, economy_packages, priority_uld_cost = get_data(
-            package_list, uld_list, priority_uld_cost
-        )
+        config = PackingConfig.from_json(request.json)
 
-        last_priority_uld, remaining_ulds = stack_priority_packages(
-            ulds, priority_packages
-        )
+        plan = request.json.get("plan")
+        if plan is None:
+            plan = results.get(request.json.get("plan_id"))
+            if plan is None:
+                return jsonify({"success": False, "error": "UNKNOWN PLAN"})
 
-        remaining_economy_packages = transition_stacking(
-            last_priority_uld, economy_packages
-        )
+        removed_packages = set(request.json.get("removed_packages", []))
+        removed_ulds = set(request.json.get("removed_ulds", []))
+        manifest = dict(request.json)
+        manifest["packages"] = [
+            package
+            for package in request.json["packages"]
+            if package["name"] not in removed_packages
+        ] + request.json.get("added_packages", [])
+        manifest["ulds"] = [
+            uld for uld in request.json["ulds"] if uld["name"] not in removed_ulds
+        ]
+        changed_ulds = {
+            package["uld"]
+            for package in plan["packages"]
+            if package["name"] in removed_packages and package["is_placed"]
+        }  # ulds that lost packages get re-stacked
+
+        plan_id = replan_fingerprint(manifest, plan)
+        cached_output_data = results.get(plan_id)
+        if cached_output_data is not None:
+            return jsonify(
+                {"success": True, "data": cached_output_data, "plan_id": plan_id}
+            )
 
-        stack_economy_packages(ulds, remaining_ulds, remaining_economy_packages)
+        package_list, uld_list, priority_uld_cost = manifest_from_json(manifest)
+        with metrics.timer("replan"):
+            output_data = replan(
+                package_list,
+                uld_list,
+                priority_uld_cost,
+                plan["packages"],
+                changed_ulds,
+                config,
+            )
+        results.put(plan_id, output_data)
+
+        return jsonify({"success": True, "data": output_data, "plan_id": plan_id})
+    except Exception as e:
+        log("ERROR", str(e), "ERROR")
+        return jsonify({"success": False, "error": str(e)})
+
+
+@app.route("/batch", methods=["POST"])
+@cross_origin()
+def batch():  # body: {"flights": [/get-coords bodies]}. Solves them in parallel and answers with one /get-coords style result per flight plus timings
+    start = time.perf_counter()
+    flights = request.json.get("flights", [])
+    flight_results = [None] * len(flights)
+    plan_ids = [None] * len(flights)
+
+    for idx, flight in enumerate(flights):
+        try:
+            plan_ids[idx] = manifest_fingerprint(flight)
+        except Exception as e:
+            flight_results[idx] = {"success": False, "error": str(e), "elapsed": 0}
+            continue
+        cached_output_data = results.get(plan_ids[idx])
+        if cached_output_data is not None:
+            metrics.count("result_cache_hits")
+            flight_results[idx] = {
+                "success": True,
+                "data": cached_output_data,
+                "elapsed": 0,
+            }
 
-        confirm_validity(ulds, priority_packages)
+    cache_hits = sum(
+        result is not None and result["success"] for result in flight_results
+    )
+    to_solve = {}  # plan id -> first flight with it, repeated manifests are solved once
+    for idx, result in enumerate(flight_results):
+        if result is None:
+            to_solve.setdefault(plan_ids[idx], idx)
+    metrics.count("result_cache_misses", len(to_solve))
+    with metrics.timer("batch"):
+        solved = jobs.solve_batch([flights[idx] for idx in to_solve.values()])
+    solved = dict(zip(to_solve, solved))
+    for idx, result in enumerate(flight_results):
+        if result is None:
+            flight_results[idx] = dict(solved[plan_ids[idx]])
+    for plan_id, result in solved.items():
+        if result["success"]:
+            results.put(plan_id, result["data"])
 
-        output_data = return_data(ulds, package_list, priority_uld_cost)
+    for idx, result in enumerate(flight_results):
+        if result["success"]:
+            result["plan_id"] = plan_ids[idx]
 
-        log("Algorithm output", output_data)
+    return jsonify(
+        {
+            "success": True,
+            "results": flight_results,
+            "timing": {
+                "flights": len(flights),
+                "solved": len(to_solve),
+                "cache_hits": cache_hits,
+                "wall_time": time.perf_counter() - start,
+                "solve_time": sum(result["elapsed"] for result in solved.values()),
+            },
+        }
+    )
 
-        return jsonify({"success": True, "data": output_data})
+
+@app.route("/jobs", methods=["POST"])
+@cross_origin()
+def submit_job():  # same body as /get-coords. Returns a job id right away, the solve runs on the worker pool
+    try:
+        PackingConfig.from_json(request.json)  # reject bad settings before queueing
+        job_id = jobs.submit(request.json, manifest_fingerprint(request.json))
+        return jsonify({"success": True, "job_id": job_id})
     except Exception as e:
-        print(e)
+        log("ERROR", str(e), "ERROR")
         return jsonify({"success": False, "error": str(e)})
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+@cross_origin()
+def job_status(job_id):
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify({"success": False, "error": "UNKNOWN JOB"}), 404
+    return jsonify({"success": True, **status})
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+@cross_origin()
+def job_events(job_id):  # streams the job status as server-sent events until the job is finished
+    if jobs.status(job_id) is None:
+        return jsonify({"success": False, "error": "UNKNOWN JOB"}), 404
+
+    def stream():
+        last = None
+        while True:
+            status = jobs.status(job_id)
+            if status is None:
+                return
+            if status != last:
+                yield f"data: {json.dumps(status)}\n\n"
+                last = status
+            if status["status"] in ("done", "failed"):
+                return
+            time.sleep(0.5)
+
+    return Response(stream(), mimetype="text/event-stream")
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+@cross_origin()
+def job_result(job_id):  # same response as /get-coords once the job is done, its plan_id works with /get-file, /download-plan and /replan
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify({"success": False, "error": "UNKNOWN JOB"}), 404
+    if status["status"] == "failed":
+        return jsonify({"success": False, "error": status["error"]})
+    if status["status"] != "done":
+        return jsonify({"success": False, "error": "JOB NOT FINISHED"}), 202
+    return jsonify(
+        {"success": True, "data": jobs.result(job_id), "plan_id": status.get("plan_id")}
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+@cross_origin()
+def get_metrics():  # counters and stage timers of every solve this server has run, including the ones on job, batch, portfolio and economy worker processes once they finish
+    return jsonify(metrics.snapshot())
+
+
 @app.route("/get-file", methods=["POST"])
 @cross_origin()
-def get_file():
-    data = request.json["output_data"]
-    fname = save_file_and_get_name(data)
+def get_file():  # takes either the output_data of a plan or the plan_id /get-coords returned with it, and optionally a "format" (csv or binary). The file expires after a while
+    if "plan_id" in request.json:
+        data = results.get(request.json["plan_id"])
+        if data is None:
+            return jsonify({"success": False, "error": "UNKNOWN PLAN"})
+    else:
+        data = request.json["output_data"]
+    try:
+        fname = exports.write(data, request.json.get("format", "csv"))
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
     return jsonify({"success": True, "filename": fname})
 
 @app.route("/download-file/<filename>", methods=["GET"])
 @cross_origin()
 def download_file(filename):
-    return send_file(filename, as_attachment=True)
+    path = exports.find(filename)
+    if path is None:
+        return jsonify({"success": False, "error": "UNKNOWN OR EXPIRED FILE"}), 404
+    return send_file(path, as_attachment=True)
+
+
+@app.route("/download-plan/<plan_id>", methods=["GET"])
+@cross_origin()
+def download_plan(plan_id):  # streams a cached plan as a file without writing it to disk first. ?format=csv (default) or binary
+    data = results.get(plan_id)
+    file_format = request.args.get("format", "csv")
+    if data is None or file_format not in EXPORT_FORMATS:
+        return jsonify({"success": False, "error": "UNKNOWN PLAN OR FORMAT"}), 404
+
+    writer, extension, mimetype = EXPORT_FORMATS[file_format]
+    return Response(
+        writer(data),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename={plan_id}{extension}"
+        },
+    )
 
 
 